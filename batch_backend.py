@@ -0,0 +1,262 @@
+import asyncio
+import itertools
+import json
+import os
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple, Type
+
+from pydantic import BaseModel
+
+from components import call_client
+
+# Deferred structured completions through the OpenAI Batch API
+# BatchClient wraps a client like RateLimitedClient does: it exposes
+# beta.chat.completions.parse (and passes embeddings.create through), so any
+# Mind or component can use it unchanged. Instead of sending each call, it
+# queues the request (model, messages and the strict JSON schema of the
+# response_format) and returns a future. Requests made within `window`
+# seconds of the first one are submitted together, as one JSONL batch, once the
+# window closes or `max_batch_size` are waiting. When the batch finishes, every
+# response is validated against its response_format and its future resolved.
+# Batched calls cost half as much (see metrics.BATCH_DISCOUNT) and a whole batch
+# is a handful of HTTP calls, but a batch can take minutes to hours: this is for
+# offline runs with many minds in flight at once (batch_runner.py --batch).
+# There is no beta.chat.completions.stream: a batched response only exists once
+# the batch finishes, so components given on_partial get the full text once.
+# The request body carries the response_format as a strict json_schema built by
+# strict_json_schema from the model's own JSON schema, the same form
+# beta.chat.completions.parse sends.
+# Transports (one must be given; the wrapped client, often a RateLimitedClient,
+# need not have the files and batches endpoints):
+# - OpenAIBatchTransport: files.create + batches.create on a raw OpenAI client,
+#   then polls batches.retrieve and downloads the output and error files.
+# - LocalBatchTransport: file-based stand-in for tests and offline runs. It
+#   writes the same input JSONL, runs each request through a client's
+#   chat.completions.create (e.g. fake_client) and reads back an output file in
+#   the Batch API format.
+
+BATCH_WINDOW = 2.0 # in seconds, how long to collect requests into one batch
+BATCH_MAX_REQUESTS = 50_000 # Batch API limit per file
+BATCH_POLL_INTERVAL = 30.0 # in seconds
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def strict_json_schema(schema: Dict[str, Any], root: Dict[str, Any] = None) -> Dict[str, Any]:
+    """A pydantic JSON schema in the form strict structured outputs accept
+
+    Every object forbids additional properties and requires all of its
+    properties, `default: null` is dropped and a $ref with sibling keywords
+    (e.g. a description) is inlined, since strict mode rejects those.
+    """
+    root = root if root is not None else schema
+    if isinstance(schema, list):
+        return [strict_json_schema(item, root) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema and len(schema) > 1:
+        referenced = root
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            referenced = referenced[part]
+        schema = {**referenced, **{key: value for key, value in schema.items() if key != "$ref"}}
+    schema = {key: strict_json_schema(value, root) for key, value in schema.items()
+              if not (key == "default" and value is None)}
+    if schema.get("type") == "object":
+        schema["additionalProperties"] = False
+        schema["required"] = list(schema.get("properties", {}))
+    return schema
+
+
+def response_format_param(response_format: Type[BaseModel]) -> Dict[str, Any]:
+    """The json_schema response_format of a request for `response_format`"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_format.__name__,
+            "schema": strict_json_schema(response_format.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+
+class BatchRequestError(Exception):
+    """A request in a batch failed or has no result"""
+
+    def __init__(self, custom_id: str, message: str, status_code: int = None):
+        super().__init__(f"Batch request {custom_id} failed: {message}")
+        self.custom_id = custom_id
+        self.status_code = status_code
+
+
+def parse_output(text: str) -> Dict[str, Dict[str, Any]]:
+    """Batch output/error file lines keyed by custom_id"""
+    results = {}
+    for line in text.splitlines():
+        if line.strip():
+            result = json.loads(line)
+            results[result["custom_id"]] = result
+    return results
+
+
+class OpenAIBatchTransport:
+    def __init__(self, client, poll_interval: float = BATCH_POLL_INTERVAL,
+                 completion_window: str = BATCH_COMPLETION_WINDOW):
+        """client: OpenAI or AsyncOpenAI client (files and batches endpoints)"""
+        self.client = client
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    async def run(self, lines: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        data = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        input_file = await call_client(self.client.files.create, file=("batch.jsonl", data), purpose="batch")
+        batch = await call_client(self.client.batches.create, input_file_id=input_file.id,
+                                  endpoint=BATCH_ENDPOINT, completion_window=self.completion_window)
+        while batch.status not in FINAL_BATCH_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            batch = await call_client(self.client.batches.retrieve, batch.id)
+
+        results = {}
+        # An expired or cancelled batch still returns the requests that finished
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await call_client(self.client.files.content, file_id)
+                results.update(parse_output(content.text))
+        if not results and batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} {batch.status}: {batch.errors}")
+        return results
+
+
+class LocalBatchTransport:
+    _batch_ids = itertools.count()
+
+    def __init__(self, directory: str, client):
+        """client: anything with chat.completions.create, called once per request"""
+        self.directory = directory
+        self.client = client
+        os.makedirs(directory, exist_ok=True)
+
+    async def _execute(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            completion = await call_client(self.client.chat.completions.create, **line["body"])
+        except Exception as e:
+            return {"id": None, "custom_id": line["custom_id"], "response": None,
+                    "error": {"code": type(e).__name__, "message": str(e)}}
+        usage = completion.usage
+        body = {
+            "choices": [{"index": 0, "message": {"role": "assistant",
+                                                 "content": completion.choices[0].message.content}}],
+            "usage": {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens,
+                      "total_tokens": usage.total_tokens},
+        }
+        return {"id": None, "custom_id": line["custom_id"], "response": {"status_code": 200, "body": body},
+                "error": None}
+
+    async def run(self, lines: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        prefix = os.path.join(self.directory, f"batch-{os.getpid()}-{next(self._batch_ids)}")
+        with open(prefix + "-input.jsonl", "w") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+        outputs = await asyncio.gather(*(self._execute(line) for line in lines))
+        with open(prefix + "-output.jsonl", "w") as f:
+            f.writelines(json.dumps(output) + "\n" for output in outputs)
+        with open(prefix + "-output.jsonl", "r") as f:
+            return parse_output(f.read())
+
+
+class BatchClient:
+    def __init__(self, client, transport, window: float = BATCH_WINDOW,
+                 max_batch_size: int = BATCH_MAX_REQUESTS):
+        """
+        Args:
+            client: Client (or wrapper) that serves embeddings.create directly.
+            transport: Runs a batch, e.g. OpenAIBatchTransport(OpenAI()).
+            window: Seconds to collect requests after the first one of a batch.
+            max_batch_size: Requests per batch; a full batch is submitted at once.
+        """
+        self.client = client
+        self.transport = transport
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, Dict[str, Any], Type[BaseModel], asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+        self._ids = itertools.count()
+        self.stats_counts = {'requests': 0, 'batches': 0, 'errors': 0}
+
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self._parse)))
+        self.embeddings = client.embeddings
+
+    async def _parse(self, model: str, messages: List[Dict[str, str]], response_format: Type[BaseModel], **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        body = {'model': model, 'messages': messages,
+                'response_format': response_format_param(response_format), **kwargs}
+        self._pending.append((f"request-{next(self._ids)}", body, response_format, future))
+        self.stats_counts['requests'] += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._submit(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _submit(self, batch: List[Tuple[str, Dict[str, Any], Type[BaseModel], asyncio.Future]]):
+        self.stats_counts['batches'] += 1
+        lines = [{'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body}
+                 for custom_id, body, _, _ in batch]
+        try:
+            results = await self.transport.run(lines)
+        except Exception as e:
+            self.stats_counts['errors'] += len(batch)
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for custom_id, _, response_format, future in batch:
+            if future.done():
+                continue
+            try:
+                future.set_result(self._completion(custom_id, results.get(custom_id), response_format))
+            except Exception as e:
+                self.stats_counts['errors'] += 1
+                future.set_exception(e)
+
+    @staticmethod
+    def _completion(custom_id: str, result: Dict[str, Any], response_format: Type[BaseModel]):
+        """Turn one batch result into the shape beta.chat.completions.parse returns"""
+        if result is None:
+            raise BatchRequestError(custom_id, "no result")
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            error = result.get("error") or (response.get("body") or {}).get("error")
+            raise BatchRequestError(custom_id, str(error), response.get("status_code"))
+        body = response["body"]
+        message = body["choices"][0]["message"]
+        content = message.get("content")
+        parsed = response_format.model_validate_json(content) if content else None
+        return SimpleNamespace(
+            choices=[SimpleNamespace(index=0, message=SimpleNamespace(
+                role="assistant", content=content, parsed=parsed, refusal=message.get("refusal")))],
+            usage=SimpleNamespace(**body["usage"]) if body.get("usage") else None,
+            # Billed at the batch discount (see metrics.record_usage)
+            batch=True,
+        )
+
+    async def wait_idle(self):
+        """Submit anything still collecting and wait for every batch in flight"""
+        self._flush()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.stats_counts)
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, Set, Tuple
+
+from termcolor import colored
+
+from batch_backend import BATCH_WINDOW
+from checkpoint import CHECKPOINT_INTERVAL
+
+# Batch processing of situations over a process pool
+# Reads situations from a JSONL file (one record per line, the text in `--field`)
+# and shards them by position: record i goes to worker i % workers. Each worker
+# process runs its own Mind over its shard, one record per turn in input order,
+# with its own save_dir (<output-dir>/worker-<n>) and client:
+# - its model calls go through a RateLimitedClient, so at most `--max-in-flight`
+#   are in flight per worker and the account quota (`--rpm`, `--tpm`) is split
+#   evenly between workers, with retries and backoff on 429s,
+# - each result is appended to worker-<n>/results.jsonl as soon as its turn ends,
+# - the Mind is checkpointed every turn (checkpoint.py), right after the result
+#   is written; a result records the checkpoint turn it belongs to.
+# - a record that fails mid-turn rolls the Mind back to its state before the
+#   record, so the next record does not see a partial turn. (Flat memories
+#   already appended to the memory store stay there.)
+# Rerunning the same command resumes: each worker restores its Minds from their
+# checkpoints and skips records already in its results file. Failed records, and
+# records whose turn is newer than the restored checkpoint (a crash between the
+# result and the checkpoint), are processed again, so no turn is applied twice. manifest.json pins the input, field and number of workers, so a
+# resumed run shards the same way.
+# Once every worker is done, results are merged in input order into
+# <output-dir>/results.jsonl.
+# Turns of one Mind depend on each other, so a Mind runs them one at a time
+# and throughput grows with `--workers` until the quota is the limit.
+# `--minds-per-worker K` runs K independent Minds (lanes) concurrently in each
+# worker, each with its own checkpoint in worker-<n>/lane-<k>: record i goes to
+# lane (i // workers) % K of its worker.
+# `--batch` sends the structured completions through the Batch API
+# (batch_backend.BatchClient) at half the price: the calls all lanes of a worker
+# make within `--batch-window` seconds become one batch, so it pays off with
+# many lanes and when minutes per turn are acceptable. With --fake, batches run
+# through LocalBatchTransport in worker-<n>/batches.
+
+# Usage:
+#   python batch_runner.py situations.jsonl --output-dir batch_run --workers 8 --rpm 5000 --tpm 2000000
+#   python batch_runner.py situations.jsonl --output-dir batch_run --workers 4 --fake --latency 0.2
+#   python batch_runner.py situations.jsonl --output-dir batch_run --workers 2 --minds-per-worker 64 --batch
+
+MAX_IN_FLIGHT = 8 # model calls in flight per worker
+
+
+def read_records(path: str, field: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(index, record) for every non-empty line; a bare string line is taken as the situation"""
+    index = 0
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield index, record if isinstance(record, dict) else {field: record}
+            index += 1
+
+
+def load_results(path: str) -> Dict[int, Dict[str, Any]]:
+    """Latest result per index; cuts off a line torn by a crash so appends stay valid"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as f:
+        data = f.read()
+    complete = data[:data.rfind(b"\n") + 1]
+    if len(complete) < len(data):
+        with open(path, 'r+b') as f:
+            f.truncate(len(complete))
+    results = {}
+    for line in complete.splitlines():
+        if line.strip():
+            result = json.loads(line)
+            results[result['index']] = result
+    return results
+
+
+def _worker_dir(options: Dict[str, Any], worker: int) -> str:
+    return os.path.join(options['output_dir'], f"worker-{worker}")
+
+
+def _lane_dir(options: Dict[str, Any], worker: int, lane: int) -> str:
+    """save_dir of one Mind (the worker directory itself when there is one lane)"""
+    if options['minds_per_worker'] == 1:
+        return _worker_dir(options, worker)
+    return os.path.join(_worker_dir(options, worker), f"lane-{lane}")
+
+
+def _create_client(options: Dict[str, Any], worker: int):
+    from rate_limiter import RateLimitedClient
+
+    if options['fake']:
+        from fake_client import AsyncFakeOpenAI
+        client = AsyncFakeOpenAI(latency=options['latency'], jitter=options['jitter'])
+    else:
+        from dotenv import load_dotenv
+        from openai import AsyncOpenAI
+
+        load_dotenv()
+        if os.getenv("OPENAI_API_KEY") is None:
+            raise EnvironmentError("OPENAI_API_KEY environment variable not set.")
+        # The wrapper owns retries, so the SDK's own retry loop is turned off
+        client = AsyncOpenAI(max_retries=0)
+    workers = options['workers']
+    limited = RateLimitedClient(client,
+                                rpm=options['rpm'] / workers if options['rpm'] else None,
+                                tpm=options['tpm'] / workers if options['tpm'] else None,
+                                max_concurrency=options['max_in_flight'])
+    if not options['batch']:
+        return limited
+
+    from batch_backend import BatchClient, LocalBatchTransport, OpenAIBatchTransport
+
+    # Batches are queued by the Batch API, not counted against the rate limits;
+    # embeddings still go through the rate limited client
+    if options['fake']:
+        transport = LocalBatchTransport(os.path.join(_worker_dir(options, worker), "batches"), client)
+    else:
+        transport = OpenAIBatchTransport(client)
+    return BatchClient(limited, transport, window=options['batch_window'])
+
+
+async def _run_lane(mind, records, out, counts: Dict[str, Any], options: Dict[str, Any]):
+    """Process one lane's records in order with its Mind"""
+    for index, record in records:
+        situation = record.get(options['field'])
+        result = {'index': index, 'id': record.get(options['id_field']), 'situation': situation}
+        state = mind.state_dict()
+        start = time.perf_counter()
+        try:
+            if not isinstance(situation, str):
+                raise ValueError(f"Record has no '{options['field']}' text")
+            if mind.initial_situation is None:
+                mind.initial_situation = situation
+            result['question'] = await mind.process_situation(situation, checkpoint=False)
+            result['emotion'] = mind.conscious_state.dominant_emotion.value
+            result['thoughts'] = [thought.content for thought in mind.conscious_state.active_thoughts[:2]]
+            result['stage_ms'] = {stage: seconds * 1000 for stage, seconds in mind.stage_timings.items()}
+            if mind.checkpointer is not None:
+                result['turn'] = mind.checkpointer.turn + 1
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+            counts['errors'] += 1
+            mind.load_state_dict(state)
+        result['seconds'] = time.perf_counter() - start
+        # Lanes share the results file; each line is written whole between awaits
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        if 'error' not in result:
+            mind.checkpoint()
+        counts['processed'] += 1
+    if options['memory_mode'] == 'hierarchical':
+        await mind.components['memory'].wait_idle()
+
+
+async def _run_shard(worker: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    from events import EVENTS
+    from metrics import METRICS
+    from mind import Mind
+
+    save_dir = _worker_dir(options, worker)
+    os.makedirs(save_dir, exist_ok=True)
+    # Output from several processes would interleave on the console, so it goes to a file
+    EVENTS.configure(level=options['event_level'], console=False, json_path=os.path.join(save_dir, "events.jsonl"))
+    results_path = os.path.join(save_dir, "results.jsonl")
+    workers, lanes = options['workers'], options['minds_per_worker']
+    counts = {'worker': worker, 'processed': 0, 'errors': 0, 'skipped': 0}
+
+    client = _create_client(options, worker)
+    minds = []
+    try:
+        for lane in range(lanes):
+            minds.append(Mind(client, save_dir=_lane_dir(options, worker, lane), memory_mode=options['memory_mode'],
+                              checkpoint_interval=options['checkpoint_interval']))
+
+        def done(index: int, result: Dict[str, Any]) -> bool:
+            if result.get('error'):
+                return False
+            checkpointer = minds[(index // workers) % lanes].checkpointer
+            # A result newer than its lane's checkpoint belongs to a turn the restored Mind never saw
+            return checkpointer is None or result.get('turn', 0) <= checkpointer.turn
+
+        finished: Set[int] = {index for index, result in load_results(results_path).items() if done(index, result)}
+        lane_records = [[] for _ in range(lanes)]
+        for index, record in read_records(options['input'], options['field']):
+            if index % workers != worker:
+                continue
+            if index in finished:
+                counts['skipped'] += 1
+                continue
+            lane_records[(index // workers) % lanes].append((index, record))
+
+        with open(results_path, 'a') as out:
+            await asyncio.gather(*(_run_lane(mind, records, out, counts, options)
+                                   for mind, records in zip(minds, lane_records)))
+        if options['batch']:
+            await client.wait_idle()
+            counts['batches'] = client.stats()['batches']
+    finally:
+        for mind in minds:
+            mind.close()
+        METRICS.write_summary(os.path.join(save_dir, "metrics.json"))
+        EVENTS.close()
+    return counts
+
+
+def run_worker(worker: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Process one shard (entry point of a worker process)"""
+    return asyncio.run(_run_shard(worker, options))
+
+
+def merge_results(options: Dict[str, Any]) -> Tuple[int, int]:
+    """Write every worker's latest results in input order; returns (results, errors)"""
+    results: Dict[int, Dict[str, Any]] = {}
+    for worker in range(options['workers']):
+        results.update(load_results(os.path.join(_worker_dir(options, worker), "results.jsonl")))
+    path = os.path.join(options['output_dir'], "results.jsonl")
+    with open(path + ".tmp", 'w') as f:
+        for index in sorted(results):
+            f.write(json.dumps(results[index]) + "\n")
+    os.replace(path + ".tmp", path)
+    return len(results), sum(1 for result in results.values() if result.get('error'))
+
+
+def check_manifest(options: Dict[str, Any]):
+    """Pin the sharding of an output directory, so a resumed run matches the first one"""
+    path = os.path.join(options['output_dir'], "manifest.json")
+    manifest = {key: options[key] for key in ('input', 'field', 'workers', 'minds_per_worker')}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise ValueError(f"{options['output_dir']} holds a run of {previous}; resume it with the same "
+                             f"input, --field, --workers and --minds-per-worker, or use a new --output-dir")
+        return
+    os.makedirs(options['output_dir'], exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a JSONL file of situations with a pool of Minds")
+    parser.add_argument("input", help="JSONL file, one situation record per line")
+    parser.add_argument("--output-dir", default="batch_run")
+    parser.add_argument("--field", default="situation", help="JSON field holding the situation text")
+    parser.add_argument("--id-field", default="id", help="JSON field copied to the result to identify it")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--minds-per-worker", type=int, default=1, help="Minds run concurrently in each worker")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT, help="Model calls in flight per worker")
+    parser.add_argument("--rpm", type=float, help="Account requests/min, split between workers")
+    parser.add_argument("--tpm", type=float, help="Account tokens/min, split between workers")
+    parser.add_argument("--memory-mode", choices=["flat", "hierarchical"], default="flat")
+    parser.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL)
+    parser.add_argument("--event-level", default="off", help="Progress events written to worker-<n>/events.jsonl")
+    parser.add_argument("--batch", action="store_true", help="Send structured completions through the Batch API")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW,
+                        help="Seconds to collect calls into one batch")
+    parser.add_argument("--fake", action="store_true", help="Use the offline fake client")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake client seconds per completion call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+
+    options = {**vars(args), 'input': os.path.abspath(args.input), 'output_dir': os.path.abspath(args.output_dir)}
+    try:
+        check_manifest(options)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(colored(f"Processing {args.input} with {args.workers} workers x {args.minds_per_worker} minds "
+                  f"into {args.output_dir}", "green"))
+    start = time.perf_counter()
+    processed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_worker, worker, options) for worker in range(args.workers)]
+        for future in futures:
+            counts = future.result()
+            processed += counts['processed']
+            batches = f", {counts['batches']} batches" if 'batches' in counts else ""
+            print(colored(f"  worker {counts['worker']}: {counts['processed']} processed, "
+                          f"{counts['errors']} failed, {counts['skipped']} already done{batches}", "blue"))
+    elapsed = time.perf_counter() - start
+
+    total, errors = merge_results(options)
+    print(colored(f"{processed} records in {elapsed:.1f} s ({processed / elapsed:.1f}/s); "
+                  f"{total} results, {errors} failed, in {os.path.join(args.output_dir, 'results.jsonl')}",
+                  "green" if not errors else "yellow"))
+
+
+if __name__ == "__main__":
+    main()
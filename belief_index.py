@@ -0,0 +1,110 @@
+import hashlib
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+from vector_index import BruteForceIndex
+
+# Index over belief statements for BeliefSystem
+# Finds the existing belief most similar to a new statement without comparing
+# against every belief:
+# 1. Lexical: each statement's word set is tokenized once and kept. A MinHash
+#    signature of `num_perm` hashes is split into `bands` bands; statements
+#    sharing any band land in the same LSH bucket and become candidates. Only
+#    candidates are checked with exact Jaccard similarity against `threshold`.
+#    With the defaults (16 bands of 4 rows) a pair with Jaccard 0.8 becomes a
+#    candidate with probability ~0.9998, one with Jaccard 0.3 with ~0.12.
+# 2. Semantic (optional): with an `embedding_threshold`, every statement is
+#    added with its embedding and, when no candidate passes the lexical check,
+#    a paraphrase with cosine similarity of at least `embedding_threshold`
+#    matches even when few words are shared.
+# Ids are positions in BeliefSystem.beliefs.
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def tokens(statement: str) -> FrozenSet[str]:
+    return frozenset(statement.lower().split())
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little") % MERSENNE_PRIME
+
+
+class BeliefIndex:
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, seed: int = 0,
+                 embedding_threshold: float = None):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        # Universal hash family h(x) = (a * x + b) mod p; products stay below 2**62
+        self._a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.int64)
+        self._b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.int64)
+        self.token_sets: List[FrozenSet[str]] = []
+        self.buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self.embedding_threshold = embedding_threshold
+        self.vectors = BruteForceIndex() if embedding_threshold is not None else None
+
+    def __len__(self) -> int:
+        return len(self.token_sets)
+
+    def signature(self, token_set: FrozenSet[str]) -> Optional[np.ndarray]:
+        """MinHash signature of a token set (None for an empty set)"""
+        if not token_set:
+            return None
+        hashes = np.fromiter((_token_hash(token) for token in token_set), dtype=np.int64, count=len(token_set))
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def candidates(self, token_set: FrozenSet[str]) -> List[int]:
+        """Ids sharing at least one LSH bucket with the token set"""
+        signature = self.signature(token_set)
+        if signature is None:
+            return []
+        found = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            found.update(self.buckets[band].get(key, ()))
+        return sorted(found)
+
+    @property
+    def semantic(self) -> bool:
+        return self.vectors is not None
+
+    def find(self, statement: str, embedding: Sequence[float] = None) -> Optional[int]:
+        """Id of the most similar indexed statement, or None if none is similar enough"""
+        token_set = tokens(statement)
+        best_id, best_score = None, self.threshold
+        for i in self.candidates(token_set):
+            score = jaccard(token_set, self.token_sets[i])
+            if score > best_score:
+                best_id, best_score = i, score
+        if best_id is not None or self.vectors is None or embedding is None:
+            return best_id
+
+        matches = self.vectors.search(embedding, 1, self.embedding_threshold)
+        return matches[0][0] if matches else None
+
+    def add(self, statement: str, embedding: Sequence[float] = None) -> int:
+        """Index a statement; its id is the number of statements indexed before it"""
+        if self.vectors is not None and embedding is None:
+            raise ValueError("A semantic BeliefIndex needs the embedding of every statement")
+        belief_id = len(self.token_sets)
+        token_set = tokens(statement)
+        self.token_sets.append(token_set)
+        signature = self.signature(token_set)
+        if signature is not None:
+            for band, key in enumerate(self._band_keys(signature)):
+                self.buckets[band].setdefault(key, []).append(belief_id)
+        if self.vectors is not None:
+            self.vectors.add([embedding])
+        return belief_id
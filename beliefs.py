@@ -1,16 +1,74 @@
+import asyncio
 import time
-from typing import Dict
-from litellm import OpenAI
-from termcolor import colored
-from components import MindComponent, MindLogger
+from typing import Awaitable, Callable, Dict, List, Sequence
+from openai import OpenAI
+from belief_index import BeliefIndex, jaccard, tokens
+from components import COMPLETION_MODEL, MindComponent, MindLogger
+from events import EVENTS
+from metrics import METRICS
 from models import Belief
+from rate_limiter import count_tokens
+
+# Belief context
+# The belief prompt does not list every belief. Beliefs are ranked by
+#   stability + confidence + recency + relevance to the current thoughts
+# (weighted by BELIEF_RANK_WEIGHTS; recency halves every BELIEF_RECENCY_HALF_LIFE
+# seconds, relevance is word overlap) and added best first until
+# BELIEF_CONTEXT_TOKENS is reached. Each belief shows its evidence as counts
+# plus its latest BELIEF_EVIDENCE_SHOWN references, and only the latest
+# BELIEF_EVIDENCE_KEPT references are stored, so both memory and prompt size
+# stay flat however long the session runs.
+
+BELIEF_CONTEXT_TOKENS = 600
+BELIEF_EVIDENCE_KEPT = 5 # references kept per belief, for each side
+BELIEF_EVIDENCE_SHOWN = 2 # references shown in the prompt, for each side
+BELIEF_RECENCY_HALF_LIFE = 3600 # in seconds
+BELIEF_RANK_WEIGHTS = {'stability': 1.0, 'confidence': 1.0, 'recency': 0.5, 'relevance': 2.0}
 
 
 class BeliefSystem(MindComponent):
-    def __init__(self, name: str, client: OpenAI, logger: 'MindLogger'):
-        super().__init__(name, client)
+    def __init__(self, name: str, client: OpenAI, logger: 'MindLogger',
+                 embed: Callable[[str], Awaitable[Sequence[float]]] = None,
+                 embedding_threshold: float = 0.9, context_tokens: int = BELIEF_CONTEXT_TOKENS, **kwargs):
+        """
+        Args:
+            embed: Optional async text -> embedding function; when given, paraphrased
+                beliefs are merged too (cosine similarity >= embedding_threshold).
+            context_tokens: Token budget for existing beliefs in the prompt.
+        """
+        super().__init__(name, client, **kwargs)
         self.beliefs: list[Belief] = []
         self.logger = logger
+        self.embed = embed
+        self.embedding_threshold = embedding_threshold
+        self.context_tokens = context_tokens
+        # [supporting, counter] evidence seen for each belief, including references no longer kept
+        self.evidence_counts: List[List[int]] = []
+        self.index = self._new_index()
+        # Set when beliefs were replaced and the index has no embeddings for them yet
+        self._index_needs_embeddings = False
+
+    def _new_index(self) -> BeliefIndex:
+        return BeliefIndex(embedding_threshold=self.embedding_threshold if self.embed else None)
+
+    def set_beliefs(self, beliefs: List[Belief], evidence_counts: List[List[int]] = None):
+        """Replace the beliefs (e.g. when restoring a session) and re-index them"""
+        self.beliefs = list(beliefs)
+        self.evidence_counts = [list(counts) for counts in evidence_counts] if evidence_counts is not None \
+            else [[len(b.supporting_thoughts), len(b.counter_thoughts)] for b in self.beliefs]
+        # Lexical matching works right away; embeddings are fetched on the next update
+        self._index_needs_embeddings = self.embed is not None and bool(self.beliefs)
+        self.index = BeliefIndex() if self._index_needs_embeddings else self._new_index()
+        for belief in self.beliefs:
+            self.index.add(belief.statement)
+
+    async def _embed_index(self):
+        """Rebuild the index with embeddings, after set_beliefs"""
+        embeddings = await asyncio.gather(*(self.embed(belief.statement) for belief in self.beliefs))
+        self.index = self._new_index()
+        for belief, embedding in zip(self.beliefs, embeddings):
+            self.index.add(belief.statement, embedding)
+        self._index_needs_embeddings = False
 
     def _get_system_prompt(self) -> str:
         return """You are the belief formation center of a mind. Analyze thoughts and form
@@ -19,42 +77,85 @@ class BeliefSystem(MindComponent):
     def _create_prompt(self, context: Dict) -> str:
         thoughts = context.get('active_thoughts', [])
         thought_contents = [t.content for t in thoughts] if thoughts else []
-        existing_beliefs = [b.statement for b in self.beliefs] if self.beliefs else []
+        existing_beliefs = self.belief_context(context)
 
         return f"""Based on these thoughts: {thought_contents}
-        And existing beliefs: {existing_beliefs}
+        And existing beliefs (most relevant first):
+{existing_beliefs}
         Analyze the evidence and form or update a belief/conclusion."""
 
+    def _rank(self, context: Dict) -> List[int]:
+        """Belief ids, best first, for the belief context"""
+        thoughts = context.get('active_thoughts', [])
+        query = tokens(" ".join([str(context.get('situation', ''))] + [t.content for t in thoughts]))
+        now = time.time()
+        weights = BELIEF_RANK_WEIGHTS
+        scores = []
+        for i, belief in enumerate(self.beliefs):
+            recency = 0.5 ** (max(0.0, now - belief.last_updated) / BELIEF_RECENCY_HALF_LIFE)
+            scores.append(weights['stability'] * belief.stability + weights['confidence'] * belief.confidence
+                          + weights['recency'] * recency + weights['relevance'] * jaccard(query, self.index.token_sets[i]))
+        return sorted(range(len(self.beliefs)), key=lambda i: -scores[i])
+
+    def _format_belief(self, i: int) -> str:
+        belief = self.beliefs[i]
+        supporting, counter = self.evidence_counts[i]
+        line = (f"- {belief.statement} (confidence {belief.confidence:.2f}, stability {belief.stability:.2f}, "
+                f"{supporting} supporting / {counter} counter")
+        references = belief.supporting_thoughts[-BELIEF_EVIDENCE_SHOWN:] + belief.counter_thoughts[-BELIEF_EVIDENCE_SHOWN:]
+        if references:
+            line += "; e.g. " + "; ".join(references)
+        return line + ")"
+
+    def belief_context(self, context: Dict) -> str:
+        """The highest ranked beliefs that fit in the context token budget, one per line"""
+        if not self.beliefs:
+            return "- none yet"
+        lines, used = [], 0
+        for i in self._rank(context):
+            line = self._format_belief(i)
+            cost = count_tokens(line, COMPLETION_MODEL)
+            if used + cost > self.context_tokens:
+                break
+            lines.append(line)
+            used += cost
+        omitted = len(self.beliefs) - len(lines)
+        if omitted:
+            lines.append(f"- ({omitted} lower-ranked beliefs omitted)")
+        return "\n".join(lines)
+
     async def evaluate_beliefs(self, context: Dict):
         """Evaluate current thoughts and update beliefs"""
-        print(colored("\n🐾 evaluating beliefs...", "blue"))
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": self._get_system_prompt()},
-                {"role": "user", "content": self._create_prompt(context)}
-            ],
-            response_format=Belief
-        )
-
-        new_belief = completion.choices[0].message.parsed
-        self._update_beliefs(new_belief)
+        EVENTS.info("evaluate_beliefs", "\n🐾 evaluating beliefs...", color="blue")
+        with METRICS.timer("component_seconds", component=self.name, operation="evaluate_beliefs"):
+            new_belief = await self._parse(self._get_system_prompt(), self._create_prompt(context), Belief)
+            await self._update_beliefs(new_belief)
         self.logger.log_to_file('beliefs.jsonl', new_belief.to_dict())
 
-    def _update_beliefs(self, new_belief: Belief):
+    async def _update_beliefs(self, new_belief: Belief):
         """Update existing beliefs or add new ones"""
+        embedding = None
+        if self.embed is not None:
+            if self._index_needs_embeddings:
+                await self._embed_index()
+            embedding = await self.embed(new_belief.statement)
 
-        # Find similar existing beliefs
-        similar_beliefs = [b for b in self.beliefs
-                        if self._belief_similarity(b.statement, new_belief.statement) > 0.8]
+        # Find a similar existing belief through the index
+        similar = self.index.find(new_belief.statement, embedding)
 
-        if similar_beliefs:
+        if similar is not None:
             # Update existing belief
-            existing_belief = similar_beliefs[0]
+            existing_belief = self.beliefs[similar]
             # Adjust confidence based on new evidence
             existing_belief.confidence = (existing_belief.confidence + new_belief.confidence) / 2
-            existing_belief.supporting_thoughts.extend(new_belief.supporting_thoughts)
-            existing_belief.counter_thoughts.extend(new_belief.counter_thoughts)
+            # Keep the latest references, count all of them
+            counts = self.evidence_counts[similar]
+            counts[0] += len(new_belief.supporting_thoughts)
+            counts[1] += len(new_belief.counter_thoughts)
+            existing_belief.supporting_thoughts = \
+                (existing_belief.supporting_thoughts + new_belief.supporting_thoughts)[-BELIEF_EVIDENCE_KEPT:]
+            existing_belief.counter_thoughts = \
+                (existing_belief.counter_thoughts + new_belief.counter_thoughts)[-BELIEF_EVIDENCE_KEPT:]
             existing_belief.last_updated = time.time()
             # Increase stability with each confirmation
             existing_belief.stability = min(1.0, existing_belief.stability + 0.1)
@@ -63,17 +164,15 @@ class BeliefSystem(MindComponent):
             # Add new belief
             new_belief.last_updated = time.time()
             new_belief.stability = 0.1  # Start with low stability
+            self.evidence_counts.append([len(new_belief.supporting_thoughts), len(new_belief.counter_thoughts)])
+            new_belief.supporting_thoughts = new_belief.supporting_thoughts[-BELIEF_EVIDENCE_KEPT:]
+            new_belief.counter_thoughts = new_belief.counter_thoughts[-BELIEF_EVIDENCE_KEPT:]
             self.beliefs.append(new_belief)
+            self.index.add(new_belief.statement, embedding)
 
     def _belief_similarity(self, belief1: str, belief2: str) -> float:
-        """Simple similarity check - can be enhanced with embeddings"""
-
-        # This is a placeholder - you might want to use embedding similarity here
-        words1 = set(belief1.lower().split())
-        words2 = set(belief2.lower().split())
-        intersection = len(words1.intersection(words2))
-        union = len(words1.union(words2))
-        return intersection / union if union > 0 else 0
+        """Word-set Jaccard similarity, the lexical check BeliefIndex applies to its candidates"""
+        return jaccard(tokens(belief1), tokens(belief2))
 
     def _log_belief(self, belief: Belief):
         """Log the belief"""
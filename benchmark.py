@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+from termcolor import colored
+
+from fake_client import AsyncFakeOpenAI, FakeOpenAI
+from events import EVENTS, OFF
+from metrics import METRICS
+from mind import Mind
+from rate_limiter import RateLimitedClient
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+
+# End-to-end turn latency benchmark
+# Drives Mind.process_situation for N turns against the deterministic fake
+# client, so the numbers measure the framework's own overhead plus whatever
+# latency is injected. Reports p50/p99 turn latency, per-stage breakdown and
+# Python heap growth.
+# With --quota-rpm and a rate limit at or under it (--rpm), any 429 from the
+# fake quota means the limiter overshot it: the run exits non-zero.
+
+# Usage:
+#   python benchmark.py --turns 200
+#   python benchmark.py --turns 50 --latency 0.4 --embedding-latency 0.1 --async-client
+#   python benchmark.py --turns 50 --semantic-threshold 0.9
+#   python benchmark.py --turns 50 --latency 0.4 --stream
+#   python benchmark.py --turns 40 --quota-rpm 600 --rpm 600
+#   python benchmark.py --turns 8 --quota-rpm 30 --rpm 30 --async-client   (takes about two minutes)
+#   python benchmark.py --situations requests.jsonl --field body
+
+SITUATIONS = [
+    "I just moved to a new city and I don't know anyone yet",
+    "My project deadline moved up by two weeks",
+    "A friend asked me for advice about changing careers",
+    "I keep forgetting where I put my keys",
+    "The weather has been grey for days",
+    "I learned something surprising about memory today",
+    "Someone disagreed with me in a meeting",
+    "I finished a long book and feel a bit empty",
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def load_situations(path: str, field: str) -> List[str]:
+    with open(path, 'r') as f:
+        return [json.loads(line)[field] for line in f if line.strip()]
+
+
+async def run_benchmark(args) -> Dict:
+    client_class = AsyncFakeOpenAI if args.async_client else FakeOpenAI
+    fake = client_class(latency=args.latency, jitter=args.jitter,
+                        embedding_latency=args.embedding_latency, dim=args.dim, quota_rpm=args.quota_rpm)
+    client = fake
+    if args.rpm or args.tpm:
+        client = RateLimitedClient(fake, rpm=args.rpm, tpm=args.tpm, max_concurrency=args.max_concurrency)
+    situations = load_situations(args.situations, args.field) if args.situations else SITUATIONS
+    save_dir = args.save_dir or tempfile.mkdtemp(prefix="mind_benchmark_")
+
+    output = contextlib.nullcontext() if args.show_output else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    response_cache = ResponseCache(os.path.join(save_dir, "responses.sqlite")) if args.response_cache else None
+    tracemalloc.start()
+    with output:
+        semantic_cache = SemanticCache(args.semantic_threshold) if args.semantic_threshold else None
+        first_partial: Dict[str, float] = {}
+
+        def on_partial(component: str, text: str):
+            first_partial.setdefault(component, time.perf_counter())
+
+        mind = Mind(client, save_dir=save_dir, response_cache=response_cache, semantic_cache=semantic_cache,
+                    on_partial=on_partial if args.stream else None, semantic_beliefs=args.semantic_beliefs,
+                    memory_mode=args.memory_mode, checkpoint_interval=args.checkpoint_interval)
+        mind.initial_situation = situations[0]
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        turn_seconds, stage_seconds, partial_seconds, heap = [], {}, {}, []
+        for turn in range(args.turns):
+            first_partial.clear()
+            start = time.perf_counter()
+            await mind.process_situation(situations[turn % len(situations)])
+            turn_seconds.append(time.perf_counter() - start)
+            for component, seen in first_partial.items():
+                partial_seconds.setdefault(component, []).append(seen - start)
+            for stage, seconds in mind.stage_timings.items():
+                stage_seconds.setdefault(stage, []).append(seconds)
+            heap.append(tracemalloc.get_traced_memory()[0] - baseline)
+        memory = mind.components['memory']
+        if args.memory_mode == 'hierarchical':
+            await memory.wait_idle()
+        mind.close()
+    tracemalloc.stop()
+
+    resume_ms = None
+    if args.checkpoint_interval:
+        # Time a restart from the checkpoint just written
+        with output:
+            start = time.perf_counter()
+            resumed = Mind(client, save_dir=save_dir, memory_mode=args.memory_mode,
+                           checkpoint_interval=args.checkpoint_interval)
+            resume_ms = (time.perf_counter() - start) * 1000
+            resumed.close()
+
+    return {
+        'turns': args.turns,
+        'save_dir': save_dir,
+        'turn_ms': {'p50': percentile(turn_seconds, 50) * 1000, 'p99': percentile(turn_seconds, 99) * 1000,
+                    'mean': statistics.fmean(turn_seconds) * 1000},
+        'stages_ms': {stage: {'p50': percentile(s, 50) * 1000, 'p99': percentile(s, 99) * 1000}
+                      for stage, s in stage_seconds.items()},
+        'first_partial_ms': {component: {'p50': percentile(s, 50) * 1000, 'p99': percentile(s, 99) * 1000}
+                             for component, s in partial_seconds.items()},
+        'heap_growth_kb': {'total': heap[-1] / 1024 if heap else 0,
+                           'per_turn': heap[-1] / 1024 / len(heap) if heap else 0},
+        'beliefs': len(mind.components['belief'].beliefs),
+        'resume_ms': resume_ms,
+        'memory_tiers': memory.stats() if args.memory_mode == 'hierarchical' else None,
+        'client_calls': dict(fake.calls),
+        'rate_limiter': client.stats() if client is not fake else None,
+        'response_cache': response_cache.stats() if response_cache else None,
+        'semantic_cache': semantic_cache.stats() if semantic_cache else None,
+    }
+
+
+def print_report(report: Dict):
+    print(colored(f"\n{report['turns']} turns (logs in {report['save_dir']})", "green"))
+    turn = report['turn_ms']
+    print(f"turn latency   p50 {turn['p50']:8.2f} ms   p99 {turn['p99']:8.2f} ms   mean {turn['mean']:8.2f} ms")
+    print(colored("per stage", "blue"))
+    for stage, ms in report['stages_ms'].items():
+        print(f"  {stage:<14} p50 {ms['p50']:8.2f} ms   p99 {ms['p99']:8.2f} ms")
+    if report['first_partial_ms']:
+        print(colored("first streamed text (since turn start)", "blue"))
+        for component, ms in report['first_partial_ms'].items():
+            print(f"  {component:<14} p50 {ms['p50']:8.2f} ms   p99 {ms['p99']:8.2f} ms")
+    growth = report['heap_growth_kb']
+    print(f"heap growth    {growth['total']:.1f} KB total, {growth['per_turn']:.2f} KB/turn")
+    print(f"beliefs        {report['beliefs']}")
+    if report['resume_ms'] is not None:
+        print(f"resume         {report['resume_ms']:.1f} ms from checkpoint")
+    if report['memory_tiers']:
+        print(f"memory tiers   {report['memory_tiers']}")
+    print(f"client calls   {report['client_calls']}")
+    if report['response_cache']:
+        print(f"response cache {report['response_cache']}")
+    if report['rate_limiter']:
+        print(f"rate limiter   {report['rate_limiter']}")
+    if report['semantic_cache']:
+        print(f"semantic cache {report['semantic_cache']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn latency benchmark with a fake OpenAI client")
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per completion call")
+    parser.add_argument("--embedding-latency", type=float, default=None, help="Seconds per embeddings call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--async-client", action="store_true", help="Use the AsyncOpenAI-style fake")
+    parser.add_argument("--stream", action="store_true", help="Stream thoughts and questions")
+    parser.add_argument("--semantic-beliefs", action="store_true", help="Merge paraphrased beliefs by embedding")
+    parser.add_argument("--memory-mode", choices=["flat", "hierarchical"], default="flat")
+    parser.add_argument("--checkpoint-interval", type=int, help="Checkpoint state, snapshotting every N turns")
+    parser.add_argument("--response-cache", action="store_true", help="Cache structured responses")
+    parser.add_argument("--semantic-threshold", type=float, help="Enable the semantic cache at this similarity")
+    parser.add_argument("--rpm", type=float, help="Rate limit the client to this many requests/min")
+    parser.add_argument("--tpm", type=float, help="Rate limit the client to this many tokens/min")
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--quota-rpm", type=int, help="Fake client answers 429 beyond this many requests/min")
+    parser.add_argument("--situations", help="JSONL file of situations")
+    parser.add_argument("--field", default="situation", help="JSON field holding the situation text")
+    parser.add_argument("--save-dir", help="Defaults to a fresh temporary directory")
+    parser.add_argument("--show-output", action="store_true", help="Keep the mind's console output")
+    parser.add_argument("--metrics-summary", help="Write the metrics JSON summary to this file")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if not args.show_output:
+        # Skip formatting the progress output instead of only hiding it
+        EVENTS.configure(level=OFF)
+    report = asyncio.run(run_benchmark(args))
+    if args.metrics_summary:
+        METRICS.write_summary(args.metrics_summary)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    rate_limited = report['client_calls'].get('rate_limited', 0)
+    if args.quota_rpm and args.rpm and args.rpm <= args.quota_rpm and rate_limited:
+        print(colored(f"FAIL: {rate_limited} requests over the quota with --rpm {args.rpm:g}", "red"))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import json
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from events import EVENTS
+
+# Crash-safe checkpoints of Mind state
+# A checkpoint directory holds:
+# - snapshot.bin: Mind.state_dict() as of some turn, as zlib-compressed JSON
+#   behind a header (magic, turn, length, CRC-32). It is written to a temporary
+#   file, fsynced and renamed over the previous snapshot, so a crash leaves
+#   either the old or the new one, never a partial file.
+# - wal.bin: a write-ahead log with one record per turn since the snapshot,
+#   holding only what changed that turn (see diff_state). Records are framed
+#   with their length and CRC-32 and fsynced; a torn record at the end (a crash
+#   mid-append) fails its check and is cut off.
+# Every `interval` turns, and on close, a new snapshot replaces the log.
+# Restoring loads the snapshot and replays the later records. Nothing else is
+# reparsed or re-embedded: flat memories are already in the memory store, and
+# embeddings needed by beliefs or memory tiers come from the embedding cache.
+
+CHECKPOINT_INTERVAL = 20 # turns between snapshots
+SNAPSHOT_MAGIC = b"MINDCKP1"
+SNAPSHOT_HEADER = struct.Struct("<8sQQI") # magic, turn, payload length, CRC-32
+RECORD_HEADER = struct.Struct("<II") # payload length, CRC-32
+
+
+def diff_state(old: Any, new: Any, path: Tuple = (), delta: Dict[str, List] = None) -> Dict[str, List]:
+    """Changes turning `old` into `new`, as paths into nested dicts
+
+    Dicts are compared key by key. A list that only changed in some positions,
+    or grew, is stored as its new length plus the changed items; anything else
+    is replaced whole.
+    """
+    delta = delta if delta is not None else {'set': [], 'lists': []}
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            if key not in old:
+                delta['set'].append([list(path) + [key], value])
+            elif old[key] != value:
+                diff_state(old[key], value, path + (key,), delta)
+        for key in old.keys() - new.keys():
+            delta['set'].append([list(path) + [key], None])
+    elif isinstance(old, list) and isinstance(new, list) and path:
+        changed = {str(i): item for i, item in enumerate(new) if i >= len(old) or old[i] != item}
+        if len(changed) < len(new):
+            delta['lists'].append([list(path), len(new), changed])
+        else:
+            delta['set'].append([list(path), new])
+    else:
+        delta['set'].append([list(path), new])
+    return delta
+
+
+def apply_delta(state: Dict[str, Any], delta: Dict[str, List]) -> Dict[str, Any]:
+    """Apply a diff_state delta to `state` in place"""
+    def parent(path: List) -> Dict:
+        node = state
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        return node
+
+    for path, value in delta['set']:
+        if not path:
+            state.clear()
+            state.update(value)
+        else:
+            parent(path)[path[-1]] = value
+    for path, length, changed in delta['lists']:
+        node = parent(path)
+        items = node.get(path[-1]) or []
+        items = items[:length] + [None] * (length - len(items))
+        for i, item in changed.items():
+            items[int(i)] = item
+        node[path[-1]] = items
+    return state
+
+
+def _fsync_directory(directory: str):
+    # Make the rename itself durable (not supported on every platform)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class Checkpointer:
+    def __init__(self, directory: str, interval: int = CHECKPOINT_INTERVAL, sync: bool = True):
+        """
+        Args:
+            directory: Where snapshot.bin and wal.bin live.
+            interval: Turns between snapshots; the log holds at most this many records.
+            sync: fsync every write (turn this off only when durability does not matter).
+        """
+        self.directory = directory
+        self.interval = interval
+        self.sync = sync
+        self.snapshot_path = os.path.join(directory, "snapshot.bin")
+        self.wal_path = os.path.join(directory, "wal.bin")
+        os.makedirs(directory, exist_ok=True)
+        self.turn = 0
+        self.snapshot_turn = 0
+        # Last recorded state, the base of the next delta
+        self._state: Dict[str, Any] = {}
+        self._wal = None
+
+    def _read_snapshot(self) -> Tuple[Dict[str, Any], int]:
+        if not os.path.exists(self.snapshot_path):
+            return {}, 0
+        with open(self.snapshot_path, 'rb') as f:
+            data = f.read()
+        magic, turn, length, crc = SNAPSHOT_HEADER.unpack_from(data) if len(data) >= SNAPSHOT_HEADER.size \
+            else (None, 0, 0, 0)
+        payload = data[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length]
+        if magic != SNAPSHOT_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            EVENTS.error("checkpoint_corrupt", "Ignoring corrupt checkpoint {path}", color="red",
+                         path=self.snapshot_path)
+            return {}, 0
+        return json.loads(zlib.decompress(payload)), turn
+
+    def _read_wal(self) -> Tuple[List[Dict[str, Any]], int]:
+        """Valid log records and the byte length they span"""
+        if not os.path.exists(self.wal_path):
+            return [], 0
+        with open(self.wal_path, 'rb') as f:
+            data = f.read()
+        records, offset = [], 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(payload) != length or zlib.crc32(payload) != crc:
+                break
+            records.append(json.loads(payload))
+            offset += RECORD_HEADER.size + length
+        return records, offset
+
+    def restore(self) -> Optional[Dict[str, Any]]:
+        """Load the snapshot and replay the log; returns None when nothing was checkpointed"""
+        state, self.snapshot_turn = self._read_snapshot()
+        self.turn = self.snapshot_turn
+        records, valid_bytes = self._read_wal()
+        for record in records:
+            # Records older than the snapshot are left over from a crash while replacing the log
+            if record['turn'] > self.turn:
+                apply_delta(state, record['delta'])
+                self.turn = record['turn']
+        if os.path.exists(self.wal_path) and os.path.getsize(self.wal_path) > valid_bytes:
+            EVENTS.warning("checkpoint_torn", "Dropping a torn checkpoint log record", color="yellow")
+            with open(self.wal_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        self._state = state
+        return state or None
+
+    def record(self, state: Dict[str, Any]):
+        """Checkpoint the state at the end of a turn"""
+        # A copy, since state_dict may share lists with the live mind
+        state = json.loads(json.dumps(state))
+        self.turn += 1
+        if self.turn - self.snapshot_turn >= self.interval:
+            self.snapshot(state)
+            return
+        payload = json.dumps({'turn': self.turn, 'delta': diff_state(self._state, state)},
+                             separators=(',', ':')).encode('utf-8')
+        if self._wal is None:
+            self._wal = open(self.wal_path, 'ab')
+        self._wal.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._wal.flush()
+        if self.sync:
+            os.fsync(self._wal.fileno())
+        self._state = state
+
+    def snapshot(self, state: Dict[str, Any]):
+        """Atomically write a full snapshot and start a new log"""
+        state = json.loads(json.dumps(state))
+        payload = zlib.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+        temporary = self.snapshot_path + ".tmp"
+        with open(temporary, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.turn, len(payload), zlib.crc32(payload)))
+            f.write(payload)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        os.replace(temporary, self.snapshot_path)
+        if self.sync:
+            _fsync_directory(self.directory)
+        # Only now is the log redundant; a crash before this point replays it on top of the new snapshot
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = open(self.wal_path, 'wb')
+        self.snapshot_turn = self.turn
+        self._state = state
+
+    def close(self, state: Dict[str, Any] = None):
+        """Snapshot the final state (if given and anything was logged) and close the log"""
+        if state is not None and self.turn > self.snapshot_turn:
+            self.snapshot(state)
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
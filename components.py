@@ -1,45 +1,410 @@
+import asyncio
+import atexit
+import gzip
+import inspect
+import io
 import json
 import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from events import EVENTS
+from metrics import METRICS
 from models import Thought
-from termcolor import colored
 from openai import OpenAI
-from typing import Dict, Any
+from pydantic import BaseModel
+from typing import IO, TYPE_CHECKING, Callable, Dict, Any, Iterator, List, Optional, Tuple, Type
+
+if TYPE_CHECKING:
+    from response_cache import ResponseCache
+
+def _open_segment(path: str) -> IO:
+    """Open a log file or rotated segment for reading text, decompressing if needed"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    if path.endswith('.zst'):
+        import zstandard
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'r')
+
+
+def log_segments(path: str) -> List[str]:
+    """Rotated segments of a log file, oldest first, followed by the live file"""
+    directory, filename = os.path.split(path)
+    pattern = re.compile(re.escape(filename) + r"\.(\d{15})(\.gz|\.zst)?")
+    segments: Dict[str, str] = {}
+    if os.path.isdir(directory or '.'):
+        for name in os.listdir(directory or '.'):
+            match = pattern.fullmatch(name)
+            # While a segment is being compressed both files exist; the raw one is complete
+            if match and (match.group(1) not in segments or not match.group(2)):
+                segments[match.group(1)] = os.path.join(directory, name)
+    paths = [segments[stamp] for stamp in sorted(segments)]
+    if os.path.exists(path):
+        paths.append(path)
+    return paths
+
+
+def read_log(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the JSON records of a log file across its rotated and compressed segments"""
+    for segment in log_segments(path):
+        with _open_segment(segment) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
 
 class MindLogger:
-    def __init__(self, save_dir: str):
+    """Appends JSON records to files in save_dir
+
+    By default every record is written and flushed immediately. In buffered mode
+    records are queued in memory and a background thread serializes and writes
+    them in batches, every `flush_interval` seconds or once `max_buffer_records`
+    are waiting, through one open handle per file. Call flush()/close() on shutdown.
+
+    Files are rotated once they reach `max_bytes` or have been written to for
+    `max_age` seconds. Closed segments (`<file>.<timestamp>`) are compressed in the
+    background with `compression` ('gzip', 'zstd' or None) and only the newest
+    `retention` segments per file are kept. Use read_log() to read them back.
+    """
+
+    def __init__(self, save_dir: str, buffered: bool = False, flush_interval: float = 1.0,
+                 max_buffer_records: int = 256, max_bytes: int = None, max_age: float = None,
+                 compression: str = 'gzip', retention: int = None):
         self.save_dir = save_dir
         os.makedirs(save_dir, exist_ok=True)
+        self.buffered = buffered
+        self.flush_interval = flush_interval
+        self.max_buffer_records = max_buffer_records
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        if compression not in ('gzip', 'zstd', None):
+            raise ValueError(f"Unknown log compression: {compression}")
+        if compression == 'zstd':
+            import zstandard  # noqa: F401 - fail early if the optional dependency is missing
+        self.compression = compression
+        self.retention = retention
+        # (filename, record, time queued)
+        self._buffer: List[Tuple[str, Dict[str, Any], float]] = []
+        self._handles: Dict[str, IO] = {}
+        self._segment_started: Dict[str, float] = {}
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MindLoggerCompress")
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._writer = None
+        if buffered:
+            self._writer = threading.Thread(target=self._write_loop, name="MindLogger", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
 
     def log_to_file(self, filename: str, data: Dict[str, Any]):
+        if self.buffered and not self._closed:
+            with self._condition:
+                self._buffer.append((filename, data, time.perf_counter()))
+                if len(self._buffer) >= self.max_buffer_records:
+                    self._condition.notify()
+            return
+
+        with self._write_lock:
+            self._maybe_rotate(filename)
+            filepath = os.path.join(self.save_dir, filename)
+            with open(filepath, 'a') as f:
+                json_str = json.dumps(data)
+                f.write(json_str + '\n')
+                f.flush()  # Ensure immediate writing to file
+
+    def _write_loop(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self.max_buffer_records:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _handle(self, filename: str) -> IO:
+        if filename not in self._handles:
+            self._handles[filename] = open(os.path.join(self.save_dir, filename), 'a')
+        return self._handles[filename]
+
+    def _maybe_rotate(self, filename: str):
+        """Close the live file as a segment if it is too large or too old (write lock held)"""
+        if self.max_bytes is None and self.max_age is None:
+            return
         filepath = os.path.join(self.save_dir, filename)
-        with open(filepath, 'a') as f:
-            json_str = json.dumps(data)
-            f.write(json_str + '\n')
-            f.flush()  # Ensure immediate writing to file
+        now = time.time()
+        started = self._segment_started.setdefault(filename, now)
+        if not os.path.exists(filepath):
+            return
+        too_big = self.max_bytes is not None and os.path.getsize(filepath) >= self.max_bytes
+        too_old = self.max_age is not None and now - started >= self.max_age
+        if not (too_big or too_old) or not os.path.getsize(filepath):
+            return
+
+        if filename in self._handles:
+            self._handles.pop(filename).close()
+        segment = f"{filepath}.{int(now * 1000):015d}"
+        while os.path.exists(segment):
+            segment = f"{filepath}.{int(segment.rsplit('.', 1)[1]) + 1:015d}"
+        os.replace(filepath, segment)
+        self._segment_started[filename] = now
+        try:
+            self._compressor.submit(self._compress_and_prune, filepath, segment)
+        except RuntimeError:
+            # Logger already closed; finish the rotation on this thread
+            self._compress_and_prune(filepath, segment)
+
+    def _compress_and_prune(self, filepath: str, segment: str):
+        """Compress a closed segment, then delete segments beyond the retention limit"""
+        try:
+            if self.compression == 'gzip':
+                with open(segment, 'rb') as src, gzip.open(segment + '.gz.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(segment + '.gz.tmp', segment + '.gz')
+                os.remove(segment)
+            elif self.compression == 'zstd':
+                import zstandard
+                with open(segment, 'rb') as src, open(segment + '.zst.tmp', 'wb') as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+                os.replace(segment + '.zst.tmp', segment + '.zst')
+                os.remove(segment)
+
+            if self.retention is not None:
+                segments = log_segments(filepath)
+                if segments and segments[-1] == filepath:
+                    segments.pop()
+                for old in segments[:max(0, len(segments) - self.retention)]:
+                    os.remove(old)
+        except Exception as e:
+            EVENTS.error("log_rotation_error", "Error rotating {segment}: {error}", color="red",
+                         segment=segment, error=e)
+
+    def flush(self):
+        """Write every queued record to disk"""
+        with self._write_lock:
+            with self._condition:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            now = time.perf_counter()
+            grouped: Dict[str, List[str]] = {}
+            for filename, data, queued in batch:
+                METRICS.observe("log_queue_wait_seconds", now - queued)
+                grouped.setdefault(filename, []).append(json.dumps(data) + '\n')
+            METRICS.inc("log_records_total", len(batch))
+            for filename, lines in grouped.items():
+                self._maybe_rotate(filename)
+                handle = self._handle(filename)
+                size, pending = handle.tell(), []
+                for line in lines:
+                    pending.append(line)
+                    size += len(line)
+                    # Rotate inside large batches too, so segments stay close to max_bytes
+                    if self.max_bytes is not None and size >= self.max_bytes:
+                        handle.write(''.join(pending))
+                        handle.flush()
+                        self._maybe_rotate(filename)
+                        handle = self._handle(filename)
+                        size, pending = handle.tell(), []
+                if pending:
+                    handle.write(''.join(pending))
+                    handle.flush()
+
+    def view(self, subdir: str) -> 'MindLoggerView':
+        """A logger for files under save_dir/subdir that shares this logger's writer"""
+        return MindLoggerView(self, subdir)
+
+    def release(self, subdir: str):
+        """Write queued records and close the open files under save_dir/subdir"""
+        self.flush()
+        prefix = os.path.join(subdir, '')
+        with self._write_lock:
+            for filename in [name for name in self._handles if name.startswith(prefix)]:
+                self._handles.pop(filename).close()
+            for filename in [name for name in self._segment_started if name.startswith(prefix)]:
+                del self._segment_started[filename]
+
+    def close(self):
+        """Flush queued records, stop the writer thread and close the files"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        if self._writer is not None:
+            self._writer.join()
+            atexit.unregister(self.close)
+        self.flush()
+        with self._write_lock:
+            for handle in self._handles.values():
+                handle.close()
+            self._handles.clear()
+        self._compressor.shutdown(wait=True)
+
+
+class MindLoggerView:
+    """A MindLogger's subdirectory, e.g. one server session's logs
+
+    Records go through the parent's buffer and writer thread, so many views cost
+    no extra threads. close() only closes this view's files.
+    """
+
+    def __init__(self, parent: MindLogger, subdir: str):
+        self.parent = parent
+        self.subdir = subdir
+        self.save_dir = os.path.join(parent.save_dir, subdir)
+        os.makedirs(self.save_dir, exist_ok=True)
+
+    def log_to_file(self, filename: str, data: Dict[str, Any]):
+        self.parent.log_to_file(os.path.join(self.subdir, filename), data)
+
+    def flush(self):
+        self.parent.flush()
+
+    def close(self):
+        self.parent.release(self.subdir)
+
+
+async def call_client(method, **kwargs):
+    """Call an OpenAI client method without blocking the event loop
+
+    Methods of AsyncOpenAI are awaited directly; methods of the synchronous
+    OpenAI client run in the default thread pool.
+    """
+    if inspect.iscoroutinefunction(method):
+        return await method(**kwargs)
+    result = await asyncio.to_thread(method, **kwargs)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+COMPLETION_MODEL = "gpt-4o-mini"
+
+# Streaming
+# With an `on_partial` callback, _parse uses the streaming structured-output
+# API (client.beta.chat.completions.stream) and calls on_partial(text) with the
+# value of the streamed field (`content` for thoughts and questions) each time
+# more of it arrives, then still returns the validated model once the stream
+# ends. Clients without a `stream` method, and cache hits, call on_partial once
+# with the complete text. The callback may be a plain function or a coroutine.
+
+OnPartial = Callable[[str], Any]
+_STREAM_DONE = object()
+
+
+async def report_partial(on_partial: OnPartial, text: Optional[str], last: Optional[str]) -> Optional[str]:
+    """Call on_partial if the streamed text grew; returns the text last reported"""
+    if not isinstance(text, str) or text == last:
+        return last
+    result = on_partial(text)
+    if inspect.isawaitable(result):
+        await result
+    return text
+
+
+def _partial_field(event, field: str) -> Optional[str]:
+    parsed = getattr(event, "parsed", None) if getattr(event, "type", None) == "content.delta" else None
+    return parsed.get(field) if isinstance(parsed, dict) else None
+
+
+async def stream_client(method, on_partial: OnPartial, field: str = "content", **kwargs):
+    """Consume a structured-output stream, reporting the partial field, and return the final completion"""
+    manager = method(**kwargs)
+    last = None
+    if hasattr(manager, "__aenter__"):
+        async with manager as stream:
+            async for event in stream:
+                last = await report_partial(on_partial, _partial_field(event, field), last)
+            return await stream.get_final_completion()
+
+    # Synchronous client: read the stream in a worker thread, report partials on the loop
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def consume():
+        try:
+            with manager as stream:
+                for event in stream:
+                    loop.call_soon_threadsafe(events.put_nowait, event)
+                return stream.get_final_completion()
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, _STREAM_DONE)
+
+    consumer = asyncio.ensure_future(asyncio.to_thread(consume))
+    while (event := await events.get()) is not _STREAM_DONE:
+        last = await report_partial(on_partial, _partial_field(event, field), last)
+    return await consumer
 
 
 class MindComponent:
-    def __init__(self, name: str, client: OpenAI):
+    def __init__(self, name: str, client: OpenAI, response_cache: 'ResponseCache' = None, use_cache: bool = True):
         self.name = name
         self.client = client
+        self.response_cache = response_cache
+        self.use_cache = use_cache
 
-    async def generate_thought(self, context: Dict) -> Thought:
-        """Generate a thought based on current context"""
-        print(colored(f"{self.name.title()} component generating thought...", "cyan"))
-        prompt = self.create_prompt(context)
-        print(colored(f"  Using prompt: {prompt}", "cyan", attrs=["dark"]))
+    async def _parse(self, system_prompt: str, prompt: str, response_format: Type[BaseModel],
+                     on_partial: OnPartial = None) -> BaseModel:
+        """Request a structured completion and return the parsed response
+
+        With on_partial, the response is streamed and on_partial receives the
+        partial `content` field as it arrives.
+        """
+        cache = self.response_cache if self.use_cache else None
+        if cache is not None:
+            key = cache.key(self.name, COMPLETION_MODEL, system_prompt, prompt, response_format)
+            cached = cache.get(key, response_format)
+            METRICS.inc("response_cache_requests_total", component=self.name,
+                        result="hit" if cached is not None else "miss")
+            if cached is not None:
+                if on_partial is not None:
+                    await report_partial(on_partial, getattr(cached, "content", None), None)
+                return cached
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": self.get_system_prompt()},
+        request = {
+            'model': COMPLETION_MODEL,
+            'messages': [
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ],
-            response_format=Thought
-        )
+            'response_format': response_format,
+        }
+        completions = self.client.beta.chat.completions
+        streaming = on_partial is not None and hasattr(completions, "stream")
+        with METRICS.timer("llm_call_seconds", component=self.name):
+            if streaming:
+                completion = await stream_client(completions.stream, on_partial, **request)
+            else:
+                completion = await call_client(completions.parse, **request)
+        METRICS.record_usage(COMPLETION_MODEL, getattr(completion, "usage", None),
+                             batch=getattr(completion, "batch", False), component=self.name)
+        parsed = completion.choices[0].message.parsed
+        if on_partial is not None and not streaming:
+            await report_partial(on_partial, getattr(parsed, "content", None), None)
+        if cache is not None and parsed is not None:
+            cache.put(key, parsed)
+        return parsed
+
+    async def generate_thought(self, context: Dict, on_partial: OnPartial = None) -> Thought:
+        """Generate a thought based on current context
+
+        on_partial, if given, is called with the thought's content as it streams in.
+        """
+        EVENTS.info("generate_thought", "{title} component generating thought...", color="cyan",
+                    title=self.name.title(), component=self.name)
+        prompt = self.create_prompt(context)
+        EVENTS.debug("prompt", "  Using prompt: {prompt}", color="cyan", attrs=["dark"],
+                     component=self.name, prompt=prompt)
 
-        thought_content = completion.choices[0].message.parsed
-        print(colored(f"  Generated thought: {thought_content.content}", "cyan"))
+        with METRICS.timer("component_seconds", component=self.name, operation="generate_thought"):
+            thought_content = await self._parse(self.get_system_prompt(), prompt, Thought, on_partial)
+        EVENTS.info("thought", "  Generated thought: {content}", color="cyan",
+                    component=self.name, content=thought_content.content)
         return thought_content
 
     def get_system_prompt(self) -> str:
@@ -1,13 +1,13 @@
 from typing import Dict
-from litellm import OpenAI
-from termcolor import colored
+from openai import OpenAI
 from components import MindComponent, MindLogger
+from events import EVENTS
 from models import Conclusion
 
 
 class ConclusionGenerator(MindComponent):
-    def __init__(self, name: str, client: OpenAI, logger: 'MindLogger'):
-        super().__init__(name, client)
+    def __init__(self, name: str, client: OpenAI, logger: 'MindLogger', **kwargs):
+        super().__init__(name, client, **kwargs)
         self.logger = logger
 
     def _get_system_prompt(self) -> str:
@@ -26,13 +26,7 @@ Generate a conclusive statement about the current understanding."""
 
     async def generate_conclusion(self, context: Dict) -> Conclusion:
         """Generate a conclusion based on current mental state"""
-        print(colored("\n> Generating conclusion...", "green"))
+        EVENTS.info("generate_conclusion", "\n> Generating conclusion...", color="green")
 
-        completion = self.client.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": self._get_system_prompt()},
-                {"role": "user", "content": self._create_prompt(context)}
-            ],
-            response_format=Conclusion
-        )
\ No newline at end of file
+        conclusion = await self._parse(self._get_system_prompt(), self._create_prompt(context), Conclusion)
+        return conclusion
\ No newline at end of file
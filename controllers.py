@@ -1,7 +1,8 @@
 from typing import Dict
-from components import MindComponent
+from components import MindComponent, OnPartial
+from events import EVENTS
+from metrics import METRICS
 from models import Question
-from termcolor import colored
 
 class EmotionalProcessor(MindComponent):
     def _get_system_prompt(self) -> str:
@@ -40,19 +41,11 @@ class QuestionGenerator(MindComponent):
         and situation: {context.get('situation', '')},
         generate a question that helps explore and build upon our understanding of the initial topic."""
     
-    async def generate_question(self, context:Dict) -> Question:
-        print(colored(f"\n ❓ generating question...", "magenta"))
-
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": self.get_system_prompt()},
-                {"role": "user", "content": self._create_prompt(context)}
-            ],
-            response_format=Question
-        )
-
-        question = completion.choices[0].message.parsed
+    async def generate_question(self, context:Dict, on_partial: OnPartial = None) -> Question:
+        EVENTS.info("generate_question", "\n ❓ generating question...", color="magenta")
+
+        with METRICS.timer("component_seconds", component=self.name, operation="generate_question"):
+            question = await self._parse(self.get_system_prompt(), self._create_prompt(context), Question, on_partial)
         # question = Question(question_content)
-        print(colored(f"  ⌙ Generated question: {question.content}", "magenta"))
+        EVENTS.info("question", "  ⌙ Generated question: {content}", color="magenta", content=question.content)
         return question
\ No newline at end of file
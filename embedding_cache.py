@@ -0,0 +1,109 @@
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Persistent, content-addressed embedding cache
+# Two tiers:
+# - Memory: LRU of float32 vectors bounded by a byte budget.
+# - Disk: SQLite table keyed by sha256(model + text), so a vector is paid for once
+#   per (model, text) across restarts. Nothing is read at startup; rows are
+#   fetched on demand and promoted into the LRU.
+
+EMBEDDING_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, model: str, max_bytes: int = EMBEDDING_CACHE_BYTES):
+        self.path = path
+        self.model = model
+        self.max_bytes = max_bytes
+        self._lru: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self._db = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the on-disk tier on first use"""
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, model TEXT, vector BLOB)"
+            )
+        return self._db
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).digest()
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """Insert into the LRU tier, evicting least recently used vectors over budget"""
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return
+        self._lru[key] = vector
+        self._bytes += vector.nbytes + len(key)
+        while self._bytes > self.max_bytes and len(self._lru) > 1:
+            old_key, old_vector = self._lru.popitem(last=False)
+            self._bytes -= old_vector.nbytes + len(old_key)
+
+    def get(self, text: str) -> Optional[List[float]]:
+        return self.get_many([text]).get(text)
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, List[float]]:
+        """Return cached embeddings for the texts that have one"""
+        found, missing = {}, {}
+        for text in texts:
+            key = self.key(text)
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                found[text] = self._lru[key].tolist()
+            else:
+                missing[key] = text
+
+        if missing:
+            keys = list(missing)
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection().execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    found[missing[key]] = vector.tolist()
+        return found
+
+    def put(self, text: str, embedding: List[float]):
+        self.put_many([(text, embedding)])
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]):
+        rows = []
+        for text, embedding in items:
+            key = self.key(text)
+            vector = np.asarray(embedding, dtype=np.float32)
+            self._remember(key, vector)
+            rows.append((key, self.model, vector.tobytes()))
+        if rows:
+            db = self._connection()
+            db.executemany("INSERT OR IGNORE INTO embeddings (key, model, vector) VALUES (?, ?, ?)", rows)
+            db.commit()
+
+    def __contains__(self, text: str) -> bool:
+        key = self.key(text)
+        if key in self._lru:
+            return True
+        return self._connection().execute("SELECT 1 FROM embeddings WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
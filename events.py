@@ -0,0 +1,185 @@
+import json
+import os
+import sys
+import threading
+import time
+from enum import Enum
+from typing import IO, Any, Dict, List, Optional, Sequence
+
+from termcolor import colored
+
+# Leveled event stream for the mind's progress output
+# Components report what they are doing as events instead of printing:
+#   EVENTS.info("thought", "  Generated thought: {content}", color="cyan", content=thought.content)
+# An event below the stream's level returns before anything is formatted, and
+# the message template is only formatted (str.format with the event fields) by
+# a sink that shows it, so quiet runs pay one comparison per event.
+# Levels: DEBUG (full prompts, every active thought), INFO (turn progress),
+# WARNING, ERROR, OFF.
+# Sinks:
+# - ConsoleSink: the colored human-readable lines (the default, at INFO)
+# - JsonSink: one JSON object per event (time, level, kind, message, fields)
+# configure() replaces the sinks; configure_from_env() reads EVENT_LEVEL,
+# EVENT_CONSOLE and EVENT_JSON. The server turns output off unless asked.
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error", OFF: "off"}
+
+
+def parse_level(level) -> int:
+    if isinstance(level, int):
+        return level
+    for number, name in LEVEL_NAMES.items():
+        if name == str(level).lower():
+            return number
+    raise ValueError(f"Unknown event level: {level}")
+
+
+def _jsonable(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, str):
+        return value
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode='json')
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_jsonable(item) for item in value]
+    return str(value)
+
+
+class Event:
+    def __init__(self, level: int, kind: str, template: str, fields: Dict[str, Any],
+                 color: str = None, attrs: Sequence[str] = None):
+        self.time = time.time()
+        self.level = level
+        self.kind = kind
+        self.template = template
+        self.fields = fields
+        self.color = color
+        self.attrs = attrs
+        self._message = None
+
+    @property
+    def message(self) -> str:
+        if self._message is None:
+            self._message = self.template.format(**self.fields) if self.fields else self.template
+        return self._message
+
+
+class ConsoleSink:
+    """Colored lines on stdout (looked up on every write, so redirect_stdout works)"""
+
+    def __init__(self, level: int = INFO, stream: IO = None):
+        self.level = parse_level(level)
+        self.stream = stream
+
+    def write(self, event: Event):
+        text = colored(event.message, event.color, attrs=event.attrs) if event.color else event.message
+        print(text, file=self.stream or sys.stdout)
+
+    def close(self):
+        pass
+
+
+class JsonSink:
+    """One JSON object per event, appended to a file or stream"""
+
+    def __init__(self, path_or_stream, level: int = DEBUG):
+        self.level = parse_level(level)
+        if isinstance(path_or_stream, str):
+            os.makedirs(os.path.dirname(path_or_stream) or ".", exist_ok=True)
+            self.stream = open(path_or_stream, 'a')
+            self._owns_stream = True
+        else:
+            self.stream = path_or_stream
+            self._owns_stream = False
+        self._lock = threading.Lock()
+
+    def write(self, event: Event):
+        record = {
+            'time': event.time,
+            'level': LEVEL_NAMES.get(event.level, event.level),
+            'kind': event.kind,
+            'message': event.message.strip(),
+            'fields': _jsonable(event.fields),
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def close(self):
+        if self._owns_stream:
+            self.stream.close()
+
+
+class EventStream:
+    def __init__(self, sinks: List = None):
+        self.sinks = []
+        self.level = OFF
+        self.set_sinks(sinks or [])
+
+    def set_sinks(self, sinks: List):
+        for sink in self.sinks:
+            if sink not in sinks:
+                sink.close()
+        self.sinks = list(sinks)
+        # Events below every sink's level are dropped before they are built
+        self.level = min((sink.level for sink in self.sinks), default=OFF)
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def emit(self, level: int, kind: str, template: str, color: str = None, attrs: Sequence[str] = None,
+             **fields):
+        if level < self.level:
+            return
+        event = Event(level, kind, template, fields, color, attrs)
+        for sink in self.sinks:
+            if level >= sink.level:
+                try:
+                    sink.write(event)
+                except Exception as e:
+                    # Output must never break a turn
+                    print(f"Event sink {type(sink).__name__} failed: {e}", file=sys.stderr)
+
+    def debug(self, kind: str, template: str, **kwargs):
+        self.emit(DEBUG, kind, template, **kwargs)
+
+    def info(self, kind: str, template: str, **kwargs):
+        self.emit(INFO, kind, template, **kwargs)
+
+    def warning(self, kind: str, template: str, **kwargs):
+        self.emit(WARNING, kind, template, **kwargs)
+
+    def error(self, kind: str, template: str, **kwargs):
+        self.emit(ERROR, kind, template, **kwargs)
+
+    def configure(self, level=INFO, console: bool = True, json_path: Optional[str] = None):
+        """Replace the sinks: console output at `level`, plus a JSON file if given"""
+        level = parse_level(level)
+        sinks = []
+        if console and level < OFF:
+            sinks.append(ConsoleSink(level))
+        if json_path and level < OFF:
+            sinks.append(JsonSink(json_path, level))
+        self.set_sinks(sinks)
+
+    def configure_from_env(self, default_level="info"):
+        self.configure(level=os.getenv("EVENT_LEVEL", default_level),
+                       console=os.getenv("EVENT_CONSOLE", "1").lower() not in ("0", "false", "no"),
+                       json_path=os.getenv("EVENT_JSON") or None)
+
+    def close(self):
+        self.set_sinks([])
+
+
+EVENTS = EventStream([ConsoleSink(INFO)])
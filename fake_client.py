@@ -0,0 +1,316 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter, deque
+from enum import Enum
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple, Type, Union, get_args, get_origin
+
+import jiter
+import numpy as np
+from pydantic import BaseModel
+
+# Deterministic offline stand-in for the OpenAI client
+# Implements the endpoints the mind uses:
+# - beta.chat.completions.parse: returns a schema-valid instance of response_format
+# - beta.chat.completions.stream: the same response as a stream of content.delta
+#   events (a few characters each, with the partially parsed JSON), the call's
+#   latency spread across the chunks
+# - embeddings.create: returns bag-of-words vectors, so texts sharing words are similar
+# - chat.completions.create: with a json_schema response_format, returns JSON
+#   content matching the schema (what LocalBatchTransport runs each request through)
+# The same request always gets the same response. `latency` (plus optional
+# `jitter`) is slept on every call to emulate the network. With `quota_rpm`
+# set, calls beyond that many in the last minute fail with a 429 carrying a
+# Retry-After header, like the real API.
+
+WORDS = (
+    "curious memory pattern light question answer reason feeling calm tension change "
+    "growth doubt trust insight signal noise balance focus drift meaning connection "
+    "habit surprise risk hope evidence belief story context detail idea"
+).split()
+
+
+def _seed(*parts: Any) -> int:
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def _tokens(text: str) -> List[str]:
+    return [token.strip(".,;:!?\"'()[]{}").lower() for token in text.split() if token.strip()]
+
+
+def fake_value(annotation: Any, name: str, rng: random.Random, prompt_words: List[str]) -> Any:
+    """Generate a plausible value of the given type annotation"""
+    origin = get_origin(annotation)
+    if origin in (list, List):
+        (item_type,) = get_args(annotation) or (str,)
+        return [fake_value(item_type, name, rng, prompt_words) for _ in range(rng.randint(1, 3))]
+    if origin is Union:
+        return fake_value(next(a for a in get_args(annotation) if a is not type(None)), name, rng, prompt_words)
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        return rng.choice(list(annotation))
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_model(annotation, rng, prompt_words)
+    if annotation is float:
+        return round(rng.random(), 3)
+    if annotation is int:
+        return rng.randint(0, 10)
+    if annotation is bool:
+        return rng.random() < 0.5
+    vocabulary = prompt_words + list(WORDS)
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(4, 12)))
+
+
+def fake_model(response_format: Type[BaseModel], rng: random.Random, prompt_words: List[str]) -> BaseModel:
+    values = {
+        name: fake_value(field.annotation, name, rng, prompt_words)
+        for name, field in response_format.model_fields.items()
+    }
+    return response_format.model_validate(values)
+
+
+def fake_json(schema: Dict[str, Any], rng: random.Random, prompt_words: List[str],
+              definitions: Dict[str, Any] = None) -> Any:
+    """Generate a plausible value matching a JSON schema (the subset pydantic emits)"""
+    definitions = definitions if definitions is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return fake_json(definitions[schema["$ref"].rsplit("/", 1)[-1]], rng, prompt_words, definitions)
+    if "anyOf" in schema:
+        option = next(s for s in schema["anyOf"] if s.get("type") != "null")
+        return fake_json(option, rng, prompt_words, definitions)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: fake_json(field, rng, prompt_words, definitions)
+                for name, field in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [fake_json(schema.get("items", {}), rng, prompt_words, definitions) for _ in range(rng.randint(1, 3))]
+    if kind == "number":
+        return round(rng.random(), 3)
+    if kind == "integer":
+        return rng.randint(0, 10)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    vocabulary = prompt_words + list(WORDS)
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(4, 12)))
+
+
+class FakeRateLimitError(Exception):
+    """Shaped like openai.RateLimitError: status_code 429 and response headers"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit reached, retry after {retry_after:.3f}s")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after-ms": str(int(retry_after * 1000))})
+
+
+class FakeBackend:
+    """Shared response generation and bookkeeping for the sync and async clients"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, embedding_latency: float = None,
+                 dim: int = 1536, seed: int = 0, quota_rpm: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.embedding_latency = latency if embedding_latency is None else embedding_latency
+        self.dim = dim
+        self.seed = seed
+        self.calls = Counter()
+        self._token_vectors: Dict[str, np.ndarray] = {}
+        self._jitter_rng = random.Random(seed)
+        self.quota_rpm = quota_rpm
+        self._recent_calls = deque()
+
+    def check_quota(self):
+        if not self.quota_rpm:
+            return
+        now = time.monotonic()
+        while self._recent_calls and now - self._recent_calls[0] >= 60:
+            self._recent_calls.popleft()
+        if len(self._recent_calls) >= self.quota_rpm:
+            self.calls["rate_limited"] += 1
+            raise FakeRateLimitError(60 - (now - self._recent_calls[0]))
+        self._recent_calls.append(now)
+
+    def delay(self, kind: str) -> float:
+        base = self.embedding_latency if kind == "embeddings" else self.latency
+        return max(0.0, base + self._jitter_rng.uniform(-self.jitter, self.jitter)) if base else 0.0
+
+    def parse(self, model: str, messages: List[Dict[str, str]], response_format: Type[BaseModel], **kwargs):
+        self.check_quota()
+        self.calls["parse"] += 1
+        rng = random.Random(_seed(self.seed, model, messages, response_format.__name__))
+        prompt_words = [word for word in _tokens(messages[-1]["content"]) if len(word) > 3][:20]
+        parsed = fake_model(response_format, rng, prompt_words)
+        content = parsed.model_dump_json()
+        prompt_tokens = sum(len(_tokens(m["content"])) for m in messages)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(
+                index=0,
+                finish_reason="stop",
+                message=SimpleNamespace(role="assistant", content=content, parsed=parsed, refusal=None),
+            )],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=len(_tokens(content)),
+                total_tokens=prompt_tokens + len(_tokens(content)),
+            ),
+        )
+
+    def create(self, model: str, messages: List[Dict[str, str]], response_format: Dict[str, Any] = None, **kwargs):
+        self.check_quota()
+        self.calls["create"] += 1
+        schema = (response_format or {}).get("json_schema", {}).get("schema", {"type": "string"})
+        rng = random.Random(_seed(self.seed, model, messages, schema.get("title")))
+        prompt_words = [word for word in _tokens(messages[-1]["content"]) if len(word) > 3][:20]
+        value = fake_json(schema, rng, prompt_words)
+        content = value if isinstance(value, str) else json.dumps(value)
+        prompt_tokens = sum(len(_tokens(m["content"])) for m in messages)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(
+                index=0,
+                finish_reason="stop",
+                message=SimpleNamespace(role="assistant", content=content, refusal=None),
+            )],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=len(_tokens(content)),
+                total_tokens=prompt_tokens + len(_tokens(content)),
+            ),
+        )
+
+    def stream_events(self, chunk_size: int = 8, **kwargs) -> Tuple[List[SimpleNamespace], SimpleNamespace]:
+        """content.delta/content.done events for a parse request, and the final completion"""
+        completion = self.parse(**kwargs)
+        content = completion.choices[0].message.content
+        events = []
+        for end in range(chunk_size, len(content) + chunk_size, chunk_size):
+            snapshot = content[:end]
+            events.append(SimpleNamespace(
+                type="content.delta", delta=snapshot[-chunk_size:], snapshot=snapshot,
+                parsed=jiter.from_json(snapshot.encode("utf-8"), partial_mode="trailing-strings"),
+            ))
+        events.append(SimpleNamespace(type="content.done", content=content,
+                                      parsed=completion.choices[0].message.parsed))
+        return events, completion
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        if token not in self._token_vectors:
+            rng = np.random.default_rng(_seed(self.seed, token))
+            self._token_vectors[token] = rng.standard_normal(self.dim).astype(np.float32)
+        return self._token_vectors[token]
+
+    def embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _tokens(text) or [""]:
+            vector += self._token_vector(token)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embeddings_create(self, model: str, input: Union[str, List[str]], **kwargs):
+        self.check_quota()
+        self.calls["embeddings"] += 1
+        texts = [input] if isinstance(input, str) else list(input)
+        tokens = sum(len(_tokens(text)) for text in texts)
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(index=i, embedding=self.embed(text), object="embedding")
+                  for i, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens),
+        )
+
+
+class FakeOpenAI:
+    """Synchronous fake, used like openai.OpenAI (blocking calls, sleeps for latency)"""
+
+    def __init__(self, **kwargs):
+        self.backend = FakeBackend(**kwargs)
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+            parse=self._parse, stream=self._stream)))
+        self.embeddings = SimpleNamespace(create=self._embeddings_create)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @property
+    def calls(self) -> Counter:
+        return self.backend.calls
+
+    def _parse(self, **kwargs):
+        time.sleep(self.backend.delay("parse"))
+        return self.backend.parse(**kwargs)
+
+    def _embeddings_create(self, **kwargs):
+        time.sleep(self.backend.delay("embeddings"))
+        return self.backend.embeddings_create(**kwargs)
+
+    def _create(self, **kwargs):
+        time.sleep(self.backend.delay("parse"))
+        return self.backend.create(**kwargs)
+
+    def _stream(self, **kwargs):
+        return FakeStream(self.backend, kwargs)
+
+
+class AsyncFakeOpenAI(FakeOpenAI):
+    """Asynchronous fake, used like openai.AsyncOpenAI"""
+
+    async def _parse(self, **kwargs):
+        await asyncio.sleep(self.backend.delay("parse"))
+        return self.backend.parse(**kwargs)
+
+    async def _embeddings_create(self, **kwargs):
+        await asyncio.sleep(self.backend.delay("embeddings"))
+        return self.backend.embeddings_create(**kwargs)
+
+    async def _create(self, **kwargs):
+        await asyncio.sleep(self.backend.delay("parse"))
+        return self.backend.create(**kwargs)
+
+    def _stream(self, **kwargs):
+        return AsyncFakeStream(self.backend, kwargs)
+
+
+class FakeStream:
+    """Context manager shaped like the ChatCompletionStreamManager/stream pair"""
+
+    def __init__(self, backend: FakeBackend, request: Dict[str, Any]):
+        self.backend = backend
+        self.request = request
+        self.events, self.completion = [], None
+
+    def __enter__(self):
+        self.events, self.completion = self.backend.stream_events(**self.request)
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        pause = self.backend.delay("parse") / len(self.events)
+        for event in self.events:
+            time.sleep(pause)
+            yield event
+
+    def get_final_completion(self):
+        return self.completion
+
+
+class AsyncFakeStream(FakeStream):
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        pause = self.backend.delay("parse") / len(self.events)
+        for event in self.events:
+            await asyncio.sleep(pause)
+            yield event
+
+    async def get_final_completion(self):
+        return self.completion
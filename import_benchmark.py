@@ -0,0 +1,72 @@
+import argparse
+import subprocess
+import sys
+
+from termcolor import colored
+
+# Import-time budget for the entry point
+# Runs `python -X importtime -c "import main"` in a fresh interpreter and fails
+# (exit code 1) if importing main takes longer than the budget, or if it pulls in
+# a heavy optional package that should only load when its subsystem is enabled.
+
+# Usage:
+#   python import_benchmark.py --budget-ms 1500
+
+IMPORT_BUDGET_MS = 1500
+LAZY_PACKAGES = [
+    "smolagents", "huggingface_hub", "mcp", "opentelemetry", "openinference",
+    "litellm", "torch", "tensorflow", "transformers",
+]
+
+
+def measure_imports(module: str):
+    """Return {top-level package: cumulative microseconds} and the module's own cumulative time"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+
+    packages, total = {}, 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        name = name.rstrip()
+        package = name.strip().split(".")[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+        if name.strip() == module and len(name) - len(name.lstrip()) == 1:
+            total = int(cumulative)
+    return packages, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if the entry point's import time regresses")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="Show the slowest top-level packages")
+    args = parser.parse_args()
+
+    packages, total = measure_imports(args.module)
+    for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:<30}{micros / 1000:>10.1f} ms")
+
+    failures = []
+    eager = [package for package in LAZY_PACKAGES if package in packages]
+    if eager:
+        failures.append(f"heavy optional packages imported eagerly: {', '.join(eager)}")
+    if total / 1000 > args.budget_ms:
+        failures.append(f"import {args.module} took {total / 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if failures:
+        for failure in failures:
+            print(colored(failure, "red"))
+        sys.exit(1)
+    print(colored(f"import {args.module}: {total / 1000:.0f} ms (budget {args.budget_ms:.0f} ms)", "green"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import time
+
+import numpy as np
+from termcolor import colored
+
+from vector_index import BruteForceIndex, IVFIndex
+
+# Recall@k vs latency report for the memory indexes
+# Compares IVFIndex settings against exact BruteForceIndex search so the
+# nlist/nprobe trade-off can be picked per deployment.
+
+# Usage:
+#   python index_benchmark.py --num-vectors 200000 --dim 1536 --k 3
+#   python index_benchmark.py --embeddings mind_logs/vectors.npy
+
+
+def synthetic_embeddings(num_vectors: int, dim: int, num_topics: int, seed: int) -> np.ndarray:
+    """Clustered random vectors, a rough stand-in for thought embeddings"""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(num_topics, dim)).astype(np.float32)
+    labels = rng.integers(num_topics, size=num_vectors)
+    return topics[labels] + rng.normal(size=(num_vectors, dim)).astype(np.float32)
+
+
+def measure(index, queries: np.ndarray, k: int):
+    """Run every query and return (results, mean latency in ms, p99 latency in ms)"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([i for i, _ in index.search(query, k)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, float(np.mean(latencies)), float(np.percentile(latencies, 99))
+
+
+def recall(exact, approximate) -> float:
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact, approximate))
+    total = sum(len(e) for e in exact)
+    return hits / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency for memory indexes")
+    parser.add_argument("--embeddings", help="Optional .npy matrix of real embeddings")
+    parser.add_argument("--num-vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nlist", type=int, nargs="*", default=[None])
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings, mmap_mode="r")
+    else:
+        vectors = synthetic_embeddings(args.num_vectors, args.dim, args.topics, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+
+    exact_index = BruteForceIndex()
+    exact_index.add(vectors)
+    exact, exact_mean, exact_p99 = measure(exact_index, queries, args.k)
+
+    print(colored(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {args.queries} queries, k={args.k}", "green"))
+    print(f"{'index':<28}{'recall@k':>10}{'mean ms':>10}{'p99 ms':>10}{'build s':>10}")
+    print(f"{'brute-force':<28}{1.0:>10.3f}{exact_mean:>10.3f}{exact_p99:>10.3f}{'-':>10}")
+
+    for nlist in args.nlist:
+        start = time.perf_counter()
+        index = IVFIndex(nlist=nlist, min_train_size=1, seed=args.seed)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        for nprobe in args.nprobe:
+            index.nprobe = nprobe
+            approximate, mean, p99 = measure(index, queries, args.k)
+            name = f"ivf nlist={len(index.centroids)} nprobe={nprobe}"
+            print(f"{name:<28}{recall(exact, approximate):>10.3f}{mean:>10.3f}{p99:>10.3f}{build_seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,76 @@
 import asyncio
 import os
 from dotenv import load_dotenv
-from openai import Client as OpenAi
-# huggingface code interpreter based agent system
-from smolagents import CodeAgent, MultiStepAgent, ManagedAgent, ToolCollection, ToolCallingAgent, DuckDuckGoSearchTool, LiteLLMModel, HfApiModel, TOOL_CALLING_SYSTEM_PROMPT # default model = Qwen/Qwen2.5-Coder-32B-Instruct # for free
-from huggingface_hub import login
-
-from mcp import StdioServerParameters
-# local imports
-# from tools import save_image_to_file, image_generation, print_chinese
-
-# from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-# from opentelemetry.sdk.trace.export import BatchSpanProcessor   
-
-from openinference.instrumentation.smolagents import SmolagentsInstrumentor
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SimpleSpanProcessor
+from openai import AsyncOpenAI
 
+from events import EVENTS
+from metrics import METRICS
 from mind import Mind
-
-endpoint = "http://0.0.0.0:6006/v1/traces"
-trace_provider = TracerProvider()
-trace_provider.add_span_processor(SimpleSpanProcessor(OTLPSpanExporter(endpoint)))
-
-SmolagentsInstrumentor().instrument(tracer_provider=trace_provider)
-
-load_dotenv()
-
-hf_api_key = os.getenv("HF_API_TOKEN")
-if hf_api_key is None:
-    raise EnvironmentError("HF_API_TOKEN environment variable not set.")
-
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if openai_api_key is None:
-    raise EnvironmentError("OPENAI_API_KEY environment variable not set.")
-
-login(hf_api_key)
+from ms import RESPONSE_CACHE, SAVE_DIR
+from rate_limiter import RateLimitedClient
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+
+# Optional subsystems are switched on through environment variables (or .env):
+#   ENABLE_TRACING=1    trace smolagents; TRACING_EXPORTER=otlp|file|memory|console,
+#                       TRACING_ENDPOINT, TRACING_FILE, TRACING_SAMPLE_RATIO,
+#                       TRACING_QUEUE_SIZE, TRACING_BATCH_SIZE, TRACING_SCHEDULE_DELAY_MS
+#   ENABLE_HF_AGENTS=1  log in to the Hugging Face Hub for the smolagents examples below
+#   ENABLE_RESPONSE_CACHE=1  reuse structured LLM responses for identical prompts
+#                       (RESPONSE_CACHE_TTL seconds, UNCACHED_COMPONENTS=belief,curiosity)
+#   OPENAI_RPM / OPENAI_TPM  rate limit the shared client to the account quota
+#                       (OPENAI_MAX_CONCURRENCY requests in flight, default 16)
+#   EVENT_LEVEL=debug   progress output level (debug|info|warning|error|off, default info);
+#                       EVENT_JSON=path also writes it as JSON lines, EVENT_CONSOLE=0
+#                       turns the console output off
+#   METRICS_PORT=9464   serve latency/token/cost metrics as Prometheus text on /metrics
+#                       (a JSON summary is written to METRICS_SUMMARY, default
+#                       mind_logs/metrics.json, at shutdown either way)
+#   CHECKPOINT_INTERVAL=20  checkpoint the mind's state every turn (a full snapshot
+#                       every N turns) and resume from it on the next start
+#   MEMORY_MODE=hierarchical  bounded immediate/short-term/long-term memory tiers
+#                       instead of the persistent store of every memory (flat)
+#   SEMANTIC_BELIEFS=1  also merge paraphrased beliefs, by embedding similarity
+#   STREAM_OUTPUT=1     print each question as it is generated
+#   ENABLE_SEMANTIC_CACHE=1  reuse thoughts for near-duplicate situations
+#                       (SEMANTIC_CACHE_THRESHOLD cosine similarity, default 0.95)
+# Their packages (smolagents, huggingface_hub, mcp, OpenTelemetry, openinference)
+# are heavy, so they are only imported when enabled. See import_benchmark.py.
+
+
+def env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def setup_tracing():
+    from tracing import TRACING_ENDPOINT, TRACING_FILE, setup_tracing as create_tracer_provider
+
+    return create_tracer_provider(
+        exporter=os.getenv("TRACING_EXPORTER", "otlp"),
+        endpoint=os.getenv("TRACING_ENDPOINT", TRACING_ENDPOINT),
+        file_path=os.getenv("TRACING_FILE", TRACING_FILE),
+        sample_ratio=float(os.getenv("TRACING_SAMPLE_RATIO", "1.0")),
+        max_queue_size=int(os.getenv("TRACING_QUEUE_SIZE", "2048")),
+        max_export_batch_size=int(os.getenv("TRACING_BATCH_SIZE", "512")),
+        schedule_delay_millis=float(os.getenv("TRACING_SCHEDULE_DELAY_MS", "5000")),
+    )
+
+
+def setup_hf_agents():
+    # huggingface code interpreter based agent system
+    from huggingface_hub import login
+
+    hf_api_key = os.getenv("HF_API_TOKEN")
+    if hf_api_key is None:
+        raise EnvironmentError("HF_API_TOKEN environment variable not set.")
+
+    login(hf_api_key)
+
+
+# The examples below need, inside the function that runs them:
+# from smolagents import CodeAgent, MultiStepAgent, ManagedAgent, ToolCollection, ToolCallingAgent, DuckDuckGoSearchTool, LiteLLMModel, HfApiModel, TOOL_CALLING_SYSTEM_PROMPT # default model = Qwen/Qwen2.5-Coder-32B-Instruct # for free
+# from tools import save_image_to_file, image_generation, print_chinese
+# from mcp import StdioServerParameters  (the MCP tool collection example)
 
 ## default huggingface agent - qwen to response - with default tools (DuckduckGoSearchTool, Python Code Interpreter, STT Audio Transcriber)
 
@@ -174,8 +208,82 @@ login(hf_api_key)
 
 # print(answer)
 
-openai = OpenAi(api_key=openai_api_key)
-
-mind = Mind(openai)
 
-asyncio.run(mind.run())
\ No newline at end of file
+def create_client():
+    """AsyncOpenAI client from OPENAI_API_KEY, rate limited when OPENAI_RPM/OPENAI_TPM are set"""
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if openai_api_key is None:
+        raise EnvironmentError("OPENAI_API_KEY environment variable not set.")
+
+    rpm, tpm = os.getenv("OPENAI_RPM"), os.getenv("OPENAI_TPM")
+    if rpm or tpm:
+        # The wrapper owns retries, so the SDK's own retry loop is turned off
+        return RateLimitedClient(
+            AsyncOpenAI(api_key=openai_api_key, max_retries=0),
+            rpm=float(rpm) if rpm else None,
+            tpm=float(tpm) if tpm else None,
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "16")),
+        )
+    return AsyncOpenAI(api_key=openai_api_key)
+
+
+def print_question_stream():
+    """on_partial callback that echoes the question while it streams in"""
+    printed = ""
+
+    def on_partial(component: str, text: str):
+        nonlocal printed
+        if component != 'curiosity':
+            return
+        if not text.startswith(printed):
+            print()
+            printed = ""
+        print(text[len(printed):], end="", flush=True)
+        printed = text
+
+    return on_partial
+
+
+def mind_options() -> dict:
+    """Mind keyword arguments for the caches enabled in the environment"""
+    response_cache = None
+    if env_flag("ENABLE_RESPONSE_CACHE"):
+        ttl = os.getenv("RESPONSE_CACHE_TTL")
+        response_cache = ResponseCache(RESPONSE_CACHE, ttl=float(ttl) if ttl else None)
+    uncached = [name.strip() for name in os.getenv("UNCACHED_COMPONENTS", "").split(",") if name.strip()]
+
+    semantic_cache = None
+    if env_flag("ENABLE_SEMANTIC_CACHE"):
+        semantic_cache = SemanticCache(threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")))
+
+    on_partial = print_question_stream() if env_flag("STREAM_OUTPUT") else None
+    return {'response_cache': response_cache, 'uncached_components': uncached, 'semantic_cache': semantic_cache,
+            'on_partial': on_partial, 'semantic_beliefs': env_flag("SEMANTIC_BELIEFS"),
+            'memory_mode': os.getenv("MEMORY_MODE", "flat"),
+            'checkpoint_interval': int(os.getenv("CHECKPOINT_INTERVAL", "0")) or None}
+
+
+def main():
+    load_dotenv()
+    EVENTS.configure_from_env()
+
+    trace_provider = setup_tracing() if env_flag("ENABLE_TRACING") else None
+    if env_flag("ENABLE_HF_AGENTS"):
+        setup_hf_agents()
+
+    if os.getenv("METRICS_PORT"):
+        METRICS.serve(int(os.getenv("METRICS_PORT")))
+
+    mind = Mind(create_client(), **mind_options())
+
+    try:
+        asyncio.run(mind.run())
+    finally:
+        METRICS.write_summary(os.getenv("METRICS_SUMMARY", os.path.join(SAVE_DIR, "metrics.json")))
+        if trace_provider is not None:
+            # Export spans still waiting in the batch queue
+            trace_provider.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import json
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Binary, memory-mapped memory store
+# One directory holds:
+# - vectors.bin: fixed-width rows of unit-length embeddings (float32 or float16)
+# - records.jsonl: one JSON record (the memory's metadata) per row
+# - offsets.bin: uint64 byte offset of each row's record in records.jsonl
+# - meta.json: dimension and dtype, written once when the store is created
+# - tags.bin / tags.json: int32 tag code of each row and the tag names, used to
+#   namespace memories (e.g. per session). Code 0 is the untagged namespace "".
+#
+# Appends are O(1): each file is only ever appended to. Opening the store maps
+# the files instead of parsing them, so startup cost does not depend on the
+# number of memories; vectors and records are paged in on demand.
+# offsets.bin is written last, so its length is the number of committed rows;
+# a crash mid-append leaves extra bytes in the other files, which are trimmed on open.
+
+
+class MemoryStore:
+    def __init__(self, directory: str, dtype: str = "float32"):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        os.makedirs(directory, exist_ok=True)
+
+        self._vectors_path = os.path.join(directory, "vectors.bin")
+        self._records_path = os.path.join(directory, "records.jsonl")
+        self._offsets_path = os.path.join(directory, "offsets.bin")
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._tags_path = os.path.join(directory, "tags.bin")
+        self._tag_names_path = os.path.join(directory, "tags.json")
+        self.tag_names: List[str] = [""]
+        if os.path.exists(self._tag_names_path):
+            with open(self._tag_names_path, 'r') as f:
+                self.tag_names = json.load(f)
+        self._tag_codes = {name: code for code, name in enumerate(self.tag_names)}
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r') as f:
+                meta = json.load(f)
+            self.dim = meta['dim']
+            self.dtype = np.dtype(meta['dtype'])
+
+        self._count = os.path.getsize(self._offsets_path) // 8 if os.path.exists(self._offsets_path) else 0
+        self._recover()
+        self._vectors = None
+        self._offsets = None
+        self._tags = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _recover(self):
+        """Drop bytes from appends that did not commit (offsets.bin is the source of truth)"""
+        if self.dim is None:
+            return
+        with open(self._offsets_path, 'r+b' if os.path.exists(self._offsets_path) else 'a+b') as f:
+            f.truncate(self._count * 8)
+            if self._count:
+                f.seek((self._count - 1) * 8)
+                last_offset = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        row_bytes = self.dim * self.dtype.itemsize
+        if os.path.exists(self._vectors_path):
+            with open(self._vectors_path, 'r+b') as f:
+                f.truncate(self._count * row_bytes)
+        if os.path.exists(self._records_path):
+            with open(self._records_path, 'r+b') as f:
+                end = 0
+                if self._count:
+                    f.seek(last_offset)
+                    end = last_offset + len(f.readline())
+                f.truncate(end)
+        # Stores created before tags existed hold only untagged rows
+        with open(self._tags_path, 'r+b' if os.path.exists(self._tags_path) else 'a+b') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self._count * 4:
+                f.write(bytes(self._count * 4 - f.tell()))
+            f.truncate(self._count * 4)
+
+    def _map(self):
+        """(Re)map the files once rows have been appended since the last mapping"""
+        if self._vectors is None or len(self._vectors) != self._count:
+            if self._count:
+                self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode='r',
+                                          shape=(self._count, self.dim))
+                self._offsets = np.memmap(self._offsets_path, dtype=np.uint64, mode='r',
+                                          shape=(self._count,))
+                self._tags = np.memmap(self._tags_path, dtype=np.int32, mode='r', shape=(self._count,))
+            else:
+                self._vectors = np.empty((0, self.dim or 0), dtype=self.dtype)
+                self._offsets = np.empty(0, dtype=np.uint64)
+                self._tags = np.empty(0, dtype=np.int32)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only (rows, dim) view of all stored vectors"""
+        self._map()
+        return self._vectors
+
+    @property
+    def tags(self) -> np.ndarray:
+        """Read-only tag code of every row"""
+        self._map()
+        return self._tags
+
+    def tag_code(self, name: str) -> int:
+        """Code of a tag name, or -1 if no row has ever been tagged with it"""
+        return self._tag_codes.get(name, -1)
+
+    def _register_tags(self, names: List[str]) -> List[int]:
+        new = [name for name in dict.fromkeys(names) if name not in self._tag_codes]
+        if new:
+            for name in new:
+                self._tag_codes[name] = len(self.tag_names)
+                self.tag_names.append(name)
+            temporary = self._tag_names_path + ".tmp"
+            with open(temporary, 'w') as f:
+                json.dump(self.tag_names, f)
+            os.replace(temporary, self._tag_names_path)
+        return [self._tag_codes[name] for name in names]
+
+    def record(self, i: int) -> Dict[str, Any]:
+        """Read the metadata record of row i"""
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        self._map()
+        with open(self._records_path, 'rb') as f:
+            f.seek(int(self._offsets[i]))
+            return json.loads(f.readline())
+
+    def append(self, records: List[Dict[str, Any]], vectors: np.ndarray, tags: List[str] = None):
+        """Append rows; vectors should already be unit-length"""
+        vectors = np.atleast_2d(np.asarray(vectors)).astype(self.dtype)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._meta_path, 'w') as f:
+                json.dump({'dim': self.dim, 'dtype': self.dtype.name}, f)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+        with open(self._vectors_path, 'ab') as f:
+            f.write(vectors.tobytes())
+
+        offsets = []
+        with open(self._records_path, 'ab') as f:
+            position = f.tell()
+            for record in records:
+                line = (json.dumps(record) + '\n').encode('utf-8')
+                offsets.append(position)
+                position += len(line)
+                f.write(line)
+
+        codes = self._register_tags(tags) if tags is not None else [0] * len(records)
+        with open(self._tags_path, 'ab') as f:
+            f.write(np.asarray(codes, dtype=np.int32).tobytes())
+
+        with open(self._offsets_path, 'ab') as f:
+            f.write(np.asarray(offsets, dtype=np.uint64).tobytes())
+        self._count += len(records)
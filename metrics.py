@@ -0,0 +1,239 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+# Latency, token and cost metrics
+# A process-wide registry (METRICS) of counters and histograms, keyed by a
+# metric name and labels such as the component. Components record into it as
+# they run:
+# - llm_call_seconds, llm_prompt_tokens, llm_completion_tokens: each model call
+#   (tokens from the API usage fields), plus llm_cost_usd_total from MODEL_PRICES
+# - component_seconds: generate_thought, generate_question, evaluate_beliefs
+# - response_cache_requests_total / embedding_cache_requests_total: hits and misses
+# - embedding_seconds, embedding_batch_texts, memory_retrieve_seconds
+# - turn_seconds, stage_seconds: the Mind turn pipeline
+# - log_queue_wait_seconds: time records wait in MindLogger's buffer
+# - rate_limiter_wait_seconds: time calls wait for rate limiter quota
+# Histograms are HDR-style: values fall into log-linear buckets (each power of
+# two split into SUB_BUCKETS), so recording is O(1), memory does not grow with
+# the number of samples and any quantile is within ~1/SUB_BUCKETS relative error.
+# Export:
+# - Prometheus text format, from METRICS.serve(port) (GET /metrics) or
+#   METRICS.prometheus(). Histograms are exported as summaries (quantiles,
+#   _sum and _count).
+# - A JSON summary, METRICS.write_summary(path), e.g. at shutdown.
+
+SUB_BUCKETS = 64
+QUANTILES = (0.5, 0.9, 0.99)
+METRICS_PORT = 9464
+BATCH_DISCOUNT = 0.5 # Batch API price relative to regular calls
+# USD per million tokens (input, output); update when prices change
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4": (30.00, 60.00),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Log-linear histogram of non-negative values"""
+
+    def __init__(self, sub_buckets: int = SUB_BUCKETS):
+        self.sub_buckets = sub_buckets
+        self.counts: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket(self, value: float) -> int:
+        mantissa, exponent = math.frexp(value) # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        return exponent * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets)
+
+    def _value(self, bucket: int) -> float:
+        """Midpoint of a bucket"""
+        exponent, sub = divmod(bucket, self.sub_buckets)
+        return math.ldexp(0.5 + (sub + 0.5) / (2 * self.sub_buckets), exponent)
+
+    def record(self, value: float):
+        value = max(0.0, value)
+        if value == 0.0:
+            self.zeros += 1
+        else:
+            bucket = self._bucket(value)
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1) + 1
+        seen = self.zeros
+        if seen >= rank:
+            return 0.0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.max, max(self.min, self._value(bucket)))
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+            **{f"p{q * 100:g}": self.quantile(q) for q in QUANTILES},
+        }
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].record(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the wall time of a block, in seconds (also around awaits)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_usage(self, model: str, usage, batch: bool = False, **labels):
+        """Record the tokens and cost of one API call from its `usage` field (batch: billed at BATCH_DISCOUNT)"""
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        self.observe("llm_prompt_tokens", prompt_tokens, model=model, **labels)
+        self.inc("llm_prompt_tokens_total", prompt_tokens, model=model, **labels)
+        if completion_tokens:
+            self.observe("llm_completion_tokens", completion_tokens, model=model, **labels)
+            self.inc("llm_completion_tokens_total", completion_tokens, model=model, **labels)
+        if model in MODEL_PRICES:
+            input_price, output_price = MODEL_PRICES[model]
+            cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+            if batch:
+                cost *= BATCH_DISCOUNT
+            self.inc("llm_cost_usd_total", cost, model=model, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        """Every counter and histogram summary, as JSON-serializable data"""
+        def series_name(labels: Labels) -> str:
+            return ",".join(f"{key}={value}" for key, value in labels) or "all"
+
+        with self._lock:
+            return {
+                'uptime_seconds': time.time() - self.started,
+                'counters': {name: {series_name(labels): value for labels, value in series.items()}
+                             for name, series in sorted(self.counters.items())},
+                'histograms': {name: {series_name(labels): histogram.summary() for labels, histogram in series.items()}
+                               for name, series in sorted(self.histograms.items())},
+            }
+
+    def write_summary(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                name = name if name.endswith("_total") else name + "_total"
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{_format_labels(labels)} {value:g}" for labels, value in series.items())
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} summary")
+                for labels, histogram in series.items():
+                    for q in QUANTILES:
+                        lines.append(f"{name}{_format_labels(labels, (('quantile', f'{q:g}'),))} "
+                                     f"{histogram.quantile(q):g}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = METRICS_PORT, host: str = "127.0.0.1"):
+        """Serve GET /metrics from a background thread"""
+        # Imported here, since most runs never serve metrics
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        if self._server is not None:
+            return self._server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="Metrics", daemon=True).start()
+        return self._server
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+METRICS = Metrics()
@@ -1,32 +1,67 @@
 import json
 import os
-from openai import OpenAI
-from typing import Dict, Any, List
 import time
-from typing import List
+from openai import AsyncOpenAI, OpenAI
+from functools import partial
+from typing import Any, Callable, Dict, List, Sequence, Union
 
-from termcolor import colored
 
-from components import MindLogger
+from components import MindLogger, MindLoggerView, report_partial
 from beliefs import BeliefSystem
+from checkpoint import Checkpointer
 from conclusions import ConclusionGenerator
+from events import EVENTS, INFO
+from metrics import METRICS
 from controllers import EmotionalProcessor, QuestionGenerator, RationalAnalyzer
-from models import ConsciousState, EmotionalState, Question, Thought
-from ms import SAVE_DIR, MemorySystem
+from models import Belief, ConsciousState, EmotionalState, Question, Thought
+from ms import LOG_MAX_BYTES, LOG_RETENTION, SAVE_DIR, HierarchicalMemorySystem, MemoryNamespace, MemorySystem
+from pipeline import Pipeline, Stage
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
 
 
 
 class Mind:
-    def __init__(self, openai_client: OpenAI):
+    def __init__(self, openai_client: Union[OpenAI, AsyncOpenAI], save_dir: str = SAVE_DIR,
+                 buffered_logging: bool = True, response_cache: ResponseCache = None,
+                 uncached_components: Sequence[str] = (), semantic_cache: SemanticCache = None,
+                 memory: Union[MemorySystem, MemoryNamespace] = None,
+                 on_partial: Callable[[str, str], Any] = None, semantic_beliefs: bool = False,
+                 memory_mode: str = 'flat', checkpoint_interval: int = None,
+                 logger: Union[MindLogger, MindLoggerView] = None):
         self.client = openai_client
-        self.logger = MindLogger(SAVE_DIR)
+        # A logger passed in (e.g. a view of the server's shared one) writes under its own save_dir
+        self.logger = logger if logger is not None else MindLogger(save_dir, buffered=buffered_logging,
+                                                                   max_bytes=LOG_MAX_BYTES, retention=LOG_RETENTION)
+        self.response_cache = response_cache
+        self.semantic_cache = semantic_cache
+        # on_partial(component, text) receives thoughts and questions as they stream in
+        self.on_partial = on_partial
+        # A memory system passed in (e.g. a session's namespace of a shared one) is owned by the caller
+        self._owns_memory = memory is None
+
+        def cache_options(name: str) -> Dict[str, Any]:
+            return {'response_cache': response_cache, 'use_cache': name not in uncached_components}
+
+        if memory_mode not in ('flat', 'hierarchical'):
+            raise ValueError(f"Unknown memory_mode: {memory_mode}")
+        if memory is not None and memory_mode != 'flat':
+            raise ValueError("memory_mode='hierarchical' builds the Mind's own memory system; "
+                             "it cannot be combined with a memory system passed in")
+        if memory is None and memory_mode == 'hierarchical':
+            # Bounded immediate/short-term/long-term tiers instead of the persistent store
+            memory = HierarchicalMemorySystem('memory', self.client, self.logger, **cache_options('memory'))
+        elif memory is None:
+            memory = MemorySystem('memory', self.client, self.logger)
+        # With semantic_beliefs, paraphrased beliefs are merged using the memory system's embeddings
+        belief_embed = memory.get_embedding if semantic_beliefs else None
         self.components = {
-            'emotional': EmotionalProcessor('emotional', self.client),
-            'rational': RationalAnalyzer('rational', self.client),
-            'memory': MemorySystem('memory', self.client, self.logger),
-            'curiosity': QuestionGenerator('curiosity', self.client),
-            'belief': BeliefSystem('belief', self.client, self.logger),
-            'conclusion': ConclusionGenerator('conclusion', self.client, self.logger),
+            'emotional': EmotionalProcessor('emotional', self.client, **cache_options('emotional')),
+            'rational': RationalAnalyzer('rational', self.client, **cache_options('rational')),
+            'memory': memory,
+            'curiosity': QuestionGenerator('curiosity', self.client, **cache_options('curiosity')),
+            'belief': BeliefSystem('belief', self.client, self.logger, embed=belief_embed, **cache_options('belief')),
+            'conclusion': ConclusionGenerator('conclusion', self.client, self.logger, **cache_options('conclusion')),
         }
         self.conscious_state = ConsciousState(
             active_thoughts=[],
@@ -36,6 +71,18 @@ class Mind:
         )
         self.questions: List[Question] = []
         self.initial_situation = None
+        self.turn_pipeline = self._build_turn_pipeline()
+        self.stage_timings: Dict[str, float] = {}
+
+        # With checkpoint_interval, state is checkpointed every turn and resumed on start
+        self.checkpointer = None
+        if checkpoint_interval:
+            self.checkpointer = Checkpointer(os.path.join(save_dir, "checkpoint"), checkpoint_interval)
+            state = self.checkpointer.restore()
+            if state is not None:
+                self.load_state_dict(state)
+                EVENTS.info("resumed", "Resumed from checkpoint at turn {turn}", color="green",
+                            turn=self.checkpointer.turn)
 
     def log_thought(self, thought: Thought):
         thought_data = thought.to_dict()
@@ -55,62 +102,149 @@ class Mind:
         }
 
 
-        question = await self.components['curiosity'].generate_question(context)
+        question = await self.components['curiosity'].generate_question(context, self._partial('curiosity'))
 
         self.questions.append(question)
         self.log_question(question)
         return question.content
     
-    async def process_situation(self, situation: str):
-        print(colored(f"\n> Processing situation: {situation}", "magenta", attrs=["bold"]))
-        print(colored("=" * 50, "magenta"))
+    def _build_turn_pipeline(self) -> Pipeline:
+        """Stages of a turn; each runs as soon as the values it needs are ready"""
+        if self.semantic_cache is not None:
+            thought_stages = [
+                Stage('situation_embedding', self._embed_situation,
+                      inputs=['situation'], outputs=['situation_embedding']),
+                Stage('emotional', self._semantic_thought('emotional'),
+                      inputs=['context', 'situation_embedding'], outputs=['emotional_thought']),
+                Stage('rational', self._semantic_thought('rational'),
+                      inputs=['context', 'situation_embedding'], outputs=['rational_thought']),
+            ]
+        else:
+            thought_stages = [
+                Stage('emotional', partial(self.components['emotional'].generate_thought,
+                                           on_partial=self._partial('emotional')),
+                      inputs=['context'], outputs=['emotional_thought']),
+                Stage('rational', partial(self.components['rational'].generate_thought,
+                                          on_partial=self._partial('rational')),
+                      inputs=['context'], outputs=['rational_thought']),
+            ]
+        return Pipeline(thought_stages + [
+            Stage('retrieve', self._retrieve_memories, inputs=['context', 'memory_snapshot'],
+                  outputs=['relevant_memories']),
+            Stage('store', self._store_thoughts, inputs=['emotional_thought', 'rational_thought']),
+            Stage('update_state', self._update_conscious_state,
+                  inputs=['situation', 'emotional_thought', 'rational_thought', 'relevant_memories'],
+                  outputs=['conscious_state']),
+            Stage('belief', self._evaluate_beliefs, inputs=['situation', 'conscious_state']),
+            Stage('question', self._generate_question, inputs=['conscious_state'], outputs=['question']),
+        ])
 
-        context = {
-            'situation': situation,
-            'current_emotion': self.conscious_state.dominant_emotion,
-            'arousal_level': self.conscious_state.arousal_level
-        }
+    def _partial(self, name: str):
+        """Streaming callback for one component, or None when not streaming"""
+        return partial(self.on_partial, name) if self.on_partial is not None else None
 
-        print(colored(f"\n Current state", "blue"))
-        print(colored(f"\n  L Emotion: {self.conscious_state.dominant_emotion}", "blue"))
-        print(colored(f"\n  L Arousal: {self.conscious_state.arousal_level}", "blue"))
+    async def _embed_situation(self, situation: str) -> List[float]:
+        return await self.components['memory'].get_embedding(situation)
 
-        print(colored(f"\n Generating component responses", "green"))
-        emotional_thought = await self.components['emotional'].generate_thought(context)
-        time.sleep(1)
-        rational_thought = await self.components['rational'].generate_thought(context)
+    def _semantic_thought(self, name: str):
+        """Thought generation that reuses the result for a near-identical earlier situation"""
+        async def generate(context: Dict, situation_embedding: List[float]) -> Thought:
+            thought = self.semantic_cache.lookup(name, situation_embedding)
+            METRICS.inc("semantic_cache_requests_total", component=name,
+                        result="hit" if thought is not None else "miss")
+            if thought is not None:
+                EVENTS.info("semantic_cache_hit", "{title} component reusing thought for a similar situation",
+                            color="cyan", title=name.title(), component=name)
+                if self.on_partial is not None:
+                    await report_partial(self._partial(name), thought.content, None)
+                return thought
+            thought = await self.components[name].generate_thought(context, self._partial(name))
+            self.semantic_cache.store(name, situation_embedding, thought)
+            return thought
+        return generate
 
+    async def _retrieve_memories(self, context: Dict, memory_snapshot: Any) -> List[Thought]:
+        # Searches only the memories stored before this turn (the snapshot), so it
+        # can run alongside storing this turn's thoughts with the same result
+        with METRICS.timer("memory_retrieve_seconds"):
+            return await self.components['memory'].retrieve_relevant_memories(
+                context, num_memories=3, similarity_threshold=0.7, snapshot=memory_snapshot)
+
+    async def _store_thoughts(self, emotional_thought: Thought, rational_thought: Thought):
         self.log_thought(emotional_thought)
         self.log_thought(rational_thought)
 
-        print(colored(f"\n Storing new thoughts on memory", "yellow"))
-        memory_system = self.components['memory']
-        await memory_system.store_memory(emotional_thought)
-        await memory_system.store_memory(rational_thought)
-
-        relevant_memories = await memory_system.retrieve_relevant_memories(context, num_memories=3, similarity_threshold=0.7)
+        EVENTS.info("store", "\n Storing new thoughts on memory", color="yellow")
+        await self.components['memory'].store_memories([emotional_thought, rational_thought])
 
-        print(colored(f"\n Updating conscious state", "magenta"))
+    async def _update_conscious_state(self, situation: str, emotional_thought: Thought,
+                                      rational_thought: Thought, relevant_memories: List[Thought]) -> ConsciousState:
+        EVENTS.info("update_state", "\n Updating conscious state", color="magenta")
 
         self.conscious_state.active_thoughts = [emotional_thought, rational_thought] + relevant_memories
         old_emotion = self.conscious_state.dominant_emotion
         self.conscious_state.dominant_emotion = self.determine_dominant_emotion()
         self.conscious_state.attention_focus = situation
 
-        print(colored(f"\n Updated state", "blue"))
-        print(colored(f"\n  L Emotion: {old_emotion} -> {self.conscious_state.dominant_emotion}", "blue"))
-        print(colored(f"\n  L Attention: {self.conscious_state.attention_focus}", "blue"))
-        print(colored(f"\n  L Active Thoughts: {self.conscious_state.active_thoughts}", "blue"))
-        print(colored("=" * 50 + "\n", "magenta"))
+        EVENTS.info("state", "\n Updated state\n\n  L Emotion: {old_emotion} -> {emotion}\n\n  L Attention: {attention}",
+                    color="blue", old_emotion=old_emotion, emotion=self.conscious_state.dominant_emotion,
+                    attention=self.conscious_state.attention_focus)
+        # Every active thought, retrieved memories included: only formatted at debug level
+        EVENTS.debug("active_thoughts", "\n  L Active Thoughts: {active_thoughts}", color="blue",
+                     active_thoughts=self.conscious_state.active_thoughts)
+        EVENTS.info("separator", "=" * 50 + "\n", color="magenta")
+        return self.conscious_state
 
+    async def _evaluate_beliefs(self, situation: str, conscious_state: ConsciousState):
         belief_context = {
-            'active_thoughts': self.conscious_state.active_thoughts,
+            'active_thoughts': conscious_state.active_thoughts,
             'situation': situation,
-            'emotion': self.conscious_state.dominant_emotion,
+            'emotion': conscious_state.dominant_emotion,
         }
-
         await self.components['belief'].evaluate_beliefs(belief_context)
 
+    async def _generate_question(self, conscious_state: ConsciousState) -> str:
+        return await self.generate_new_question()
+
+    async def process_situation(self, situation: str, checkpoint: bool = True) -> str:
+        """Run one turn and return the follow-up question
+
+        With checkpoint=False the turn is not checkpointed; the caller calls
+        checkpoint() once it has stored the turn's result.
+        """
+        EVENTS.info("turn", "\n> Processing situation: {situation}", color="magenta", attrs=["bold"],
+                    situation=situation)
+        EVENTS.info("separator", "=" * 50, color="magenta")
+
+        context = {
+            'situation': situation,
+            'current_emotion': self.conscious_state.dominant_emotion,
+            'arousal_level': self.conscious_state.arousal_level
+        }
+
+        EVENTS.info("state", "\n Current state\n\n  L Emotion: {emotion}\n\n  L Arousal: {arousal}", color="blue",
+                    emotion=self.conscious_state.dominant_emotion, arousal=self.conscious_state.arousal_level)
+        EVENTS.info("generate", "\n Generating component responses", color="green")
+        start = time.perf_counter()
+        values, self.stage_timings = await self.turn_pipeline.run(
+            situation=situation, context=context, memory_snapshot=self.components['memory'].snapshot())
+        METRICS.observe("turn_seconds", time.perf_counter() - start)
+        for stage, seconds in self.stage_timings.items():
+            METRICS.observe("stage_seconds", seconds, stage=stage)
+        if checkpoint:
+            self.checkpoint()
+
+        if EVENTS.enabled(INFO):
+            lines = "".join(f"\n  L {stage}: {seconds * 1000:.0f} ms" for stage, seconds in self.stage_timings.items())
+            EVENTS.info("stage_timings", "\n Stage timings{lines}", color="blue", attrs=["dark"], lines=lines,
+                        stage_ms={stage: seconds * 1000 for stage, seconds in self.stage_timings.items()})
+        return values['question']
+
+    def checkpoint(self):
+        """Checkpoint the state at the end of a turn (without checkpoint_interval, nothing)"""
+        if self.checkpointer is not None:
+            self.checkpointer.record(self.state_dict())
+
     def determine_dominant_emotion(self):
         """Determine dominant emotion based on active thoughts"""
         if not self.conscious_state.active_thoughts:
@@ -134,16 +268,51 @@ class Mind:
 
     async def explore(self, situation: str):
         await self.process_situation(situation)
-        await self.generate_new_question()
 
         while True:
             user_input = input("Enter a response (or 'q' to quit): ")
             if user_input.lower() == 'q':
                 break
             await self.process_situation(user_input)
-            await self.generate_new_question()
 
         print("Goodbye!")
 
+    def state_dict(self) -> Dict[str, Any]:
+        """JSON-serializable conversation state (flat memories live in the memory store)"""
+        return {
+            'initial_situation': self.initial_situation,
+            'conscious_state': self.conscious_state.model_dump(mode='json'),
+            'questions': [question.model_dump(mode='json') for question in self.questions],
+            'beliefs': [belief.model_dump(mode='json') for belief in self.components['belief'].beliefs],
+            'belief_evidence_counts': self.components['belief'].evidence_counts,
+            'memory': self.components['memory'].state_dict(),
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        """Restore the state saved by state_dict"""
+        self.initial_situation = state['initial_situation']
+        self.conscious_state = ConsciousState.model_validate(state['conscious_state'])
+        self.questions = [Question.model_validate(question) for question in state['questions']]
+        self.components['belief'].set_beliefs([Belief.model_validate(belief) for belief in state['beliefs']],
+                                              state.get('belief_evidence_counts'))
+        self.components['memory'].load_state_dict(state.get('memory', {}))
+
+    def close(self, shared: bool = True):
+        """Flush pending log records and release files
+
+        With shared=False the response cache is left open, for minds that share
+        it (see server.py).
+        """
+        if self.checkpointer is not None:
+            self.checkpointer.close(self.state_dict())
+        self.logger.close()
+        if self._owns_memory:
+            self.components['memory'].close()
+        if shared and self.response_cache is not None:
+            self.response_cache.close()
+
     async def run(self):
-        await self.explore(self.initial_situation)
\ No newline at end of file
+        try:
+            await self.explore(self.initial_situation)
+        finally:
+            self.close()
\ No newline at end of file
@@ -72,3 +72,13 @@ class Conclusion(BaseModel):
     supporting_beliefs: List[str] = Field(description="Key beliefs supporting this conclusion")
     context: str = Field(description="The context in which this conclusion was generated")
     timestamp: float = Field(description="When the conclusion was generated")
+
+class MemorySummary(BaseModel):
+    summary: str = Field(description="Concise summary of the memories")
+    importance: float = Field(description="How important this is to remember long-term, between 0 and 1")
+
+    def to_dict(self):
+        return {
+            "summary": self.summary,
+            "importance": self.importance,
+        }
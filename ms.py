@@ -1,104 +1,237 @@
+import asyncio
 import os
 import json
-from termcolor import colored
 # from openai import AsyncOpenAI
 # from datetime import datetime
-# import numpy as np
-from typing import Dict, Any, List
-
-from models import Thought
-
-# Hierarchical Memory System
-# This is the most sophisticated memory system, implementing a three-tier approach
-# that combines immediate context, short-term summaries, and long-term embeddings.
-
-# How it works:
-# 1. Three-tiered memory structure:
-#    - Immediate context: Last few messages [IMMEDIATE_CONTEXT_SIZE]
-#    - Short-term memory: Summaries of recent conversations [SHORT_TERM_SIZE]
-#    - Long-term memory: Important embedded memories [LONG_TERM_SIZE]
-
-# 2. Memory flow:
-#    a. New messages go to immediate context.
-#    b. Overflow from immediate context is summarized into short-term memory.
-#    c. Important summaries are embedded and stored in long-term memory.
-
-# 3. Retrieval process:
-#    - Always includes immediate context.
-#    - Uses embeddings to find relevant long-term memories.
-#    - Uses GPT to find relevant short-term summaries.
-#    - Combines all relevant information with proper context markers.
-
-# Key features:
-# - Comprehensive memory management.
-# - Adaptive memory flow between tiers.
-# - Importance-based filtration.
-# - Automatic memory retrieval.
-
-# Use cases:
-# - Applications requiring both detailed recent context and historical information.
-# - Long-running conversations.
-# - Situations where memory organization is critical.
+from typing import Awaitable, Callable, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+from components import MindComponent, call_client, read_log
+from embedding_cache import EmbeddingCache
+from events import EVENTS
+from memory_store import MemoryStore
+from metrics import METRICS
+from models import EmotionalState, MemorySummary, Thought
+from vector_index import BruteForceIndex, VectorIndex, normalize, top_k
+
+# Memory systems
+# MemorySystem keeps every memory: a persistent store of thoughts and their
+# embeddings, searched by cosine similarity through a vector index. The store
+# is the only copy written per turn; memories.json (MEMORY_LOG) is only read, to
+# import memories from before the store existed, and written by export_memories.
+
+# HierarchicalMemorySystem keeps a bounded amount instead, in three tiers:
+# 1. Immediate context: the last IMMEDIATE_CONTEXT_SIZE thoughts, verbatim.
+# 2. Short-term memory: the last SHORT_TERM_SIZE summaries. Thoughts leaving the
+#    immediate context are grouped in chunks of SUMMARY_CHUNK_SIZE, and a
+#    background task summarizes each chunk and rates its importance in a single
+#    structured call (MemorySummarizer), then embeds the summary.
+# 3. Long-term memory: summaries leaving short-term memory with importance of at
+#    least IMPORTANCE_THRESHOLD; the LONG_TERM_SIZE most important are kept.
+# Retrieval embeds the context once and ranks the thoughts and summaries of every
+# tier together by cosine similarity. Summaries are returned as thoughts whose
+# source names their tier and whose intensity is their importance.
+# Tiers are saved with Mind.state_dict (without embeddings, which come back
+# from the embedding cache); summaries are also logged to summaries.jsonl.
 
 # Constants
 MODEL = "gpt-4"
-EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_MODEL = "text-embedding-3-small"
 IMMEDIATE_CONTEXT_SIZE = 5
 SHORT_TERM_SIZE = 20
 LONG_TERM_SIZE = 100
 IMPORTANCE_THRESHOLD = 0.7
+SUMMARY_CHUNK_SIZE = 6 # thoughts per short-term summary (three turns)
 MAX_ITERATIONS = None
 SLEEP_DURATION = 2 # in seconds
 
 SAVE_DIR="mind_logs"
 THOUGHT_LOG=f"{SAVE_DIR}/thoughts.jsonl"
-MEMORY_LOG=f"{SAVE_DIR}/memory.jsonl"
-EMBEDDING_LOG=f"{SAVE_DIR}/embeddings.jsonl"
+MEMORY_LOG=f"{SAVE_DIR}/memories.json"
+EMBEDDING_LOG=f"{SAVE_DIR}/embeddings.json"
+EMBEDDING_CACHE=f"{SAVE_DIR}/embeddings.sqlite"
+MEMORY_STORE=f"{SAVE_DIR}/memory_store"
+RESPONSE_CACHE=f"{SAVE_DIR}/responses.sqlite"
 STATE_LOG=f"{SAVE_DIR}/state.jsonl"
 QUESTION_LOG=f"{SAVE_DIR}/questions.jsonl"
 BELIEF_LOG=f"{SAVE_DIR}/beliefs.jsonl"
 CONCLUSION_LOG=f"{SAVE_DIR}/conclusions.jsonl"
 CONCLUSION_INTERVAL = 5 
+LOG_MAX_BYTES = 64 * 1024 * 1024 # rotate log files at this size
+LOG_RETENTION = 20 # compressed segments kept per log file
+EMBEDDING_BATCH_SIZE = 256 # texts per embeddings request
+EMBEDDING_BATCH_WINDOW = 0.01 # in seconds, how long to wait for more texts to coalesce
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding calls into batched requests
+
+    Calls to `embed` made within `window` seconds of each other share one request
+    to `embed_batch`. A batch is sent early once it reaches `max_batch_size` texts.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 window: float = EMBEDDING_BATCH_WINDOW, max_batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.embed_batch = embed_batch
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer = None
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Identical texts in one window are only embedded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            embeddings = dict(zip(texts, await self.embed_batch(texts)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if not future.done():
+                future.set_result(embeddings[text])
+
+
+class StoredMemories(Sequence):
+    """Read-only list of the thoughts in a MemoryStore, parsed on access"""
+
+    def __init__(self, store: MemoryStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return Thought(**self.store.record(i))
 
 
 class MemorySystem:
-    def __init__(self, name: str, client, logger):
+    def __init__(self, name: str, client, logger, index: VectorIndex = None,
+                 embeddings_cache: EmbeddingCache = None, store: MemoryStore = None):
         self.name = name
         self.client = client
         self.logger = logger
-        self.memories: List['Thought'] = []
-        self.embeddings_cache: Dict[str, List[float]] = {}
+        self.embeddings_cache = embeddings_cache if embeddings_cache is not None \
+            else EmbeddingCache(self._path(EMBEDDING_CACHE), EMBEDDING_MODEL)
+        self.batcher = EmbeddingBatcher(self._request_embeddings)
+        self._open_store(store, index)
+
+    def _open_store(self, store: MemoryStore, index: VectorIndex):
+        """Open the persistent store of every memory and index it"""
+        self.store = store if store is not None else MemoryStore(self._path(MEMORY_STORE))
+        self.memories = StoredMemories(self.store)
+        # Memories from a legacy log, stored and indexed once they have embeddings
+        self._unindexed: List['Thought'] = []
+        # Held while appending to the store, so imported memories always come
+        # before later ones and snapshot() counts stay valid
+        self._append_lock = asyncio.Lock()
+        # Index id i belongs to self.memories[i]
+        self.index = index if index is not None else BruteForceIndex()
+        self.index.load(self.store.vectors)
         self._load_existing_memories()
 
+    def _path(self, default_path: str) -> str:
+        """Place one of the default SAVE_DIR files in the logger's directory"""
+        return os.path.join(self.logger.save_dir, os.path.relpath(default_path, SAVE_DIR))
+
     def _load_existing_memories(self):
-        """Load existing memories and their embeddings from files"""
+        """Import memories logged before the memory store existed"""
         try:
+            # Import embeddings logged before the persistent cache existed
+            if not os.path.exists(self.embeddings_cache.path):
+                self.embeddings_cache.put_many(
+                    (data['content'], data['embedding']) for data in read_log(self._path(EMBEDDING_LOG))
+                )
+
             # Load memories
-            if os.path.exists("MEMORY_LOG"):
-                with open("MEMORY_LOG", 'r') as f:
-                    for line in f:
-                        memory_data = json.loads(line)
-                        thought = Thought(memory_data)
-                        self.memories.append(thought)
-
-            # Load embeddings
-            if os.path.exists("EMBEDDING_LOG"):
-                with open("EMBEDDING_LOG", 'r') as f:
-                    for line in f:
-                        embedding_data = json.loads(line)
-                        self.embeddings_cache[embedding_data['content']] = embedding_data['embedding']
-
-            print(colored(f"Loaded {len(self.memories)} memories and {len(self.embeddings_cache)} embeddings", "green"))
+            if not len(self.store):
+                for memory_data in read_log(self._path(MEMORY_LOG)):
+                    thought = Thought(**memory_data)
+                    self._unindexed.append(thought)
+
+            EVENTS.info("memories_loaded", "Loaded {count} memories, {unindexed} to import", color="green",
+                        count=len(self.memories), unindexed=len(self._unindexed))
         except Exception as e:
-            print(colored(f"Error loading memories: {e}", "red"))
+            EVENTS.error("memories_load_error", "Error loading memories: {error}", color="red", error=e)
+
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts with a single call to OpenAI's API"""
+        METRICS.observe("embedding_batch_texts", len(texts))
+        with METRICS.timer("embedding_seconds"):
+            response = await call_client(
+                self.client.embeddings.create,
+                model=EMBEDDING_MODEL,
+                input=texts
+            )
+        METRICS.record_usage(EMBEDDING_MODEL, getattr(response, "usage", None), component=self.name)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
     async def get_embedding(self, text: str) -> List[float]:
-        """Get embedding for text using OpenAI's API"""
-        response = self.client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text
-        )
-        return response.data[0].embedding
+        """Get embedding for text, from the cache or batched with other concurrent requests"""
+        return (await self.get_embeddings([text]))[0]
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for several texts in as few requests as possible"""
+        cached = self.embeddings_cache.get_many(texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in cached]
+        misses = sum(text not in cached for text in texts)
+        METRICS.inc("embedding_cache_requests_total", len(texts) - misses, result="hit")
+        METRICS.inc("embedding_cache_requests_total", misses, result="miss")
+        if missing:
+            embeddings = await asyncio.gather(*(self.batcher.embed(text) for text in missing))
+            fetched = dict(zip(missing, embeddings))
+            self.embeddings_cache.put_many(fetched.items())
+            cached.update(fetched)
+        return [cached[text] for text in texts]
+
+    def _append(self, thoughts: List['Thought'], embeddings: List[List[float]], namespace: str = ""):
+        """Persist memories to the store and add them to the index"""
+        vectors = normalize(embeddings)
+        self.store.append([thought.to_dict() for thought in thoughts], vectors, tags=[namespace] * len(thoughts))
+        self.index.add(vectors)
+
+    async def _sync_index(self):
+        """Store and index memories imported from a legacy log (with _append_lock held)"""
+        if not self._unindexed:
+            return
+        pending = list(self._unindexed)
+        EVENTS.info("indexing", "Indexing {count} memories...", color="yellow", count=len(pending))
+        embeddings = await self.get_embeddings([m.content for m in pending])
+        # They stay counted in _unindexed until they are in the store
+        self._append(pending, embeddings)
+        del self._unindexed[:len(pending)]
+
+    def _context_string(self, context: Dict) -> str:
+        """Combine a retrieval context into the text that is embedded as the query"""
+        context_string = f"{context.get('situation', '')} {context.get('current_emotion', '')}"
+        if 'active_thoughts' in context:
+            thought_contents = [t.content for t in context['active_thoughts']]
+            context_string += ' ' + ' '.join(thought_contents)
+        return context_string
 
     def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -109,264 +242,336 @@ class MemorySystem:
 
     async def store_memory(self, thought: 'Thought'):
         """Store memory and its embedding"""
-        print(colored(f"Storing memory: {thought.content[:50]}...", "yellow"))
+        await self.store_memories([thought])
+
+    async def store_memories(self, thoughts: List['Thought'], namespace: str = ""):
+        """Store several memories, embedding them with a single request
+
+        `namespace` tags the memories (e.g. with a session id) so that searches
+        can be limited to them.
+        """
+        if not thoughts:
+            return
+        for thought in thoughts:
+            EVENTS.info("store_memory", "Storing memory: {content}...", color="yellow", content=thought.content[:50])
+
+        # Get embeddings for the thought contents
+        embeddings = await self.get_embeddings([thought.content for thought in thoughts])
+
+        # Store the memories, after any imported ones
+        async with self._append_lock:
+            await self._sync_index()
+            self._append(thoughts, embeddings, namespace)
+
+    def export_memories(self, path: str = None) -> str:
+        """Write every stored memory as JSON lines (default: memories.json in the log directory)"""
+        path = path or self._path(MEMORY_LOG)
+        names, tags = self.store.tag_names, self.store.tags
+        with open(path + ".tmp", 'w') as f:
+            for i, memory in enumerate(self.memories):
+                memory_data = memory.to_dict()
+                if names[tags[i]]:
+                    memory_data['namespace'] = names[tags[i]]
+                f.write(json.dumps(memory_data) + '\n')
+        os.replace(path + ".tmp", path)
+        return path
+
+    def snapshot(self) -> int:
+        """Marker of the memories stored so far (see retrieve_relevant_memories)"""
+        return len(self.memories) + len(self._unindexed)
+
+    async def retrieve_relevant_memories(self, context: Dict, num_memories: int = 3, similarity_threshold: float = 0.5,
+                                         namespace: str = None, snapshot: int = None) -> List[Dict[str, Any]]:
+        """Retrieve relevant memories based on semantic similarity
+
+        With a namespace, only memories stored under it are searched. With a
+        snapshot, only memories stored before it was taken are searched, even
+        if others are stored while the search runs.
+        """
+        EVENTS.info("retrieve", "\n 🔎 Searching for relevant memories...", color="yellow")
+        if not self.memories and not self._unindexed:
+            return []
+        
+        context_string = self._context_string(context)
+        EVENTS.info("retrieve_context", " L Context: {context}...", color="yellow", attrs=["dark"],
+                    context=context_string[:100])
 
-        # Get embedding for the thought content
-        embedding = await self.get_embedding(thought.content)
-        self.embeddings_cache[thought.content] = embedding
+        # Get embedding for the context
+        context_embedding = await self.get_embedding(context_string)
 
-        # Store the memory
-        self.memories.append(thought)
-        memory_data = thought.to_dict()
-        self.logger.log_to_file("memories.json", memory_data)
+        # Make sure every memory is searchable
+        async with self._append_lock:
+            await self._sync_index()
 
-        # Store the embedding
-        embedding_data = {
-            'content': thought.content,
-            'embedding': embedding
-        }
-        self.logger.log_to_file("embeddings.json", embedding_data)
+        mask = None
+        if namespace is not None:
+            code = self.store.tag_code(namespace)
+            if code < 0:
+                return []
+            mask = self.store.tags == code
+        if snapshot is not None and snapshot < len(self.memories):
+            if mask is None:
+                mask = np.ones(len(self.memories), dtype=bool)
+            mask[snapshot:] = False
+        matches = self.index.search(context_embedding, num_memories, similarity_threshold, mask=mask)
+        return [self.memories[i] for i, _ in matches]
 
-    async def retrieve_relevant_memories(self, context: Dict, num_memories: int = 3, similarity_threshold: float = 0.5) -> List[Dict[str, Any]]:
-        """Retrieve relevant memories based on semantic similarity"""
-        print(colored("\n 🔎 Searching for relevant memories...", "yellow")) 
-        if not self.memories:
-            return []
-        
-        # Create a combined context string
-        context_string = f"{context.get('situation', '')} {context.get('current_emotion', '')}"
-        if 'active_thoughts' in context:
-            thought_contents = [t.content for t in context['active_thoughts']]
-            context_string += ' ' + ' '.join(thought_contents)
+    def namespace(self, namespace: str) -> 'MemoryNamespace':
+        """View of this memory system that only stores and searches under `namespace`"""
+        return MemoryNamespace(self, namespace)
 
-        print(colored(f" L Context: {context_string[:100]}...", "yellow", attrs=["dark"]))
+    def state_dict(self) -> Dict[str, Any]:
+        """Memories live in the store, so there is no per-conversation state"""
+        return {}
 
-        # Get embedding for the context
-        context_embedding = await self.get_embedding(context_string)
+    def load_state_dict(self, state: Dict[str, Any]):
+        pass
 
-        # Calculate similarities and sort memories
-        similarities = []
-        for memory in self.memories:
-            # Get or calculate memory embedding
-            if memory.content not in self.embeddings_cache:
-                memory_embedding = await self.get_embedding(memory.content)
-                self.embeddings_cache[memory.content] = memory_embedding
-            else:
-                memory_embedding = self.embeddings_cache[memory.content]
-
-            # Calculate similarity
-            similarity = self._cosine_similarity(context_embedding, memory_embedding)
-            similarities.append((memory, similarity))
-
-        # Filter memories based on similarity threshold
-        filtered_memories = [mem for mem, sim in similarities if sim >= similarity_threshold]
-        
-        # Sort by similarity and return top N memories
-        sorted_memories = sorted(filtered_memories, key=lambda x: x[1], reverse=True)[:num_memories]
-        return [mem[0] for mem in sorted_memories]
-
-# class HierarchicalMemory:
-#     def __init__(self):
-#         self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-#         # Three-tier memory system
-#         self.immediate_context = []  # Last few messages
-#         self.short_term_memory = []  # Recent summaries
-#         self.long_term_memory = []  # Important embeddings
-
-#         print(colored("Hierarchical memory system initialized.", "green"))
-    
-#     async def create_embedding(self, text):
-#         """
-#         Creates an embedding for the given text.
-
-#         Args:
-#             text (str): The input text.
-
-#         Returns:
-#             numpy.ndarray: The embedding of the input text.
-#         """
-#         try:
-#             response = await self.client.embeddings.create(
-#                 model=EMBEDDING_MODEL,
-#                 input=text
-#             )
-#             return response.data[0].embedding
-#         except Exception as e:
-#             print(colored(f"Error creating embedding: {str(e)}", "red"))
-#             return None
-
-#     async def assess_importance(self, message):
-#         """
-#         Assess the importance of a given message.
-
-#         Uses a GPT model to rate the importance of the given message on a scale of 0 to 1.
-
-#         Args:
-#             message (dict): The message to be assessed.
-
-#         Returns:
-#             float: The importance rating of the message.
-#         """
-#         try:
-#             response = await self.client.chat.completions.create(
-#                 model=MODEL,
-#                 messages=[
-#                     {
-#                         "role": "system", "content": "Rate the importance of this message for long-term memory on a scale of 0 to 1. Respond with only the number."},
-#                     {"role": "user", "content": message["content"]}
-#                 ]
-#             )
-#             return float(response.choices[0].message.content.strip())
-#         except Exception as e:
-#             print(colored(f"Error assessing importance: {str(e)}", "red"))
-#             return 0.0
-
-#     async def create_summary(self, messages):
-#         """
-#         Creates a concise summary of a conversation chunk.
-
-#         Args:
-#             messages (list[dict]): The messages to be summarized.
-
-#         Returns:
-#             str: The summary of the conversation chunk.
-#         """
-#         try:
-#             messages_text = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-#             response = await self.client.chat.completions.create(
-#                 model=MODEL,
-#                 messages=[
-#                     {"role": "system", "content": "Create a concise summary of this conversation chunk."},
-#                     {"role": "user", "content": messages_text}
-#                 ]
-#             )
-#             return response.choices[0].message.content
-#         except Exception as e:
-#             print(colored(f"Error creating summary: {str(e)}", "red"))
-#             return None
-
-#     async def add_memory(self, message):
-#         """
-#         Adds a new message to the memory system.
-
-#         First, the message is given a timestamp. Then, it is added to the immediate context.
-#         If the immediate context grows too large, the oldest messages are converted to short-term
-#         memory items. If the short-term memory grows too large, the oldest items are processed
-#         for potential long-term storage based on their importance. Finally, the long-term memory
-#         is trimmed to its maximum size if necessary.
-
-#         :param message: The message to be added to the memory system.
-#         :type message: dict
-#         """
-#         # Add timestamp
-#         message["timestamp"] = datetime.now().isoformat()
-
-#         # Update immediate context
-#         self.immediate_context.append(message)
-#         if len(self.immediate_context) > IMMEDIATE_CONTEXT_SIZE:
-#             overflow_messages = self.immediate_context[:-IMMEDIATE_CONTEXT_SIZE]
-#             self.immediate_context = self.immediate_context[-IMMEDIATE_CONTEXT_SIZE:]
-
-#             # Convert overflow to short-term memory
-#             if overflow_messages:
-#                 summary = await self.create_summary(overflow_messages)
-#                 if summary:
-#                     self.short_term_memory.append({
-#                         "summary": summary,
-#                         "messages": overflow_messages,
-#                         "timestamp": overflow_messages[-1]["timestamp"]
-#                     })
-
-#                     # Maintain short-term memory size
-#                     if len(self.short_term_memory) > SHORT_TERM_SIZE:
-#                         overflow_summaries = self.short_term_memory[:-SHORT_TERM_SIZE]
-#                         self.short_term_memory = self.short_term_memory[-SHORT_TERM_SIZE:]
-
-#                         # Process important entries for long-term storage
-#                         for summary_item in overflow_summaries:
-#                             importance = await self.assess_importance({"content": summary_item["summary"]})
-
-#                             if importance >= IMPORTANCE_THRESHOLD:
-#                                 embedding = await self.create_embedding(summary_item["summary"])
-#                                 if embedding:
-#                                     self.long_term_memory.append({
-#                                         "summary": summary_item["summary"],
-#                                         "embedding": embedding,
-#                                         "importance": importance,
-#                                         "timestamp": summary_item["timestamp"]
-#                                     })
-
-#                         # Maintain long-term memory size
-#                         if len(self.long_term_memory) > LONG_TERM_SIZE:
-#                             self.long_term_memory.sort(key=lambda x: x["importance"], reverse=True)
-#                             self.long_term_memory = self.long_term_memory[:LONG_TERM_SIZE]
-
-#         print(colored(f"Memory added successfully!", "green"))
-
-#     async def get_relevant_memories(self, query):
-#         """
-#         Retrieves relevant memories from the immediate context, long-term memory, and short-term memory for the given query.
-
-#         Args:
-#             query (str): The query to search for relevant memories.
-
-#         Returns:
-#             list: A list of dictionaries containing the relevant memories. Each dictionary contains the key-value pairs:
-#                 - role (str): The role of the speaker. Set to "assistant".
-#                 - content (str): The relevant memory content.
-#         """
-#         relevant_memories = []
-
-#         # include inmediate context
-#         relevant_memories.extend(self.immediate_context)
-
-#         # Find embeddings for long-term memory
-#         query_embedding = await self.create_embedding(query)
-#         if query_embedding:
-#             # Find relevant long-term memories
-#             similarities = []
-#             for memory in self.long_term_memory:
-#                 similarity = np.dot(query_embedding, memory["embedding"]) / (
-#                     np.linalg.norm(query_embedding) * np.linalg.norm(memory["embedding"])
-#                 )
-#                 similarities.append((similarity, memory))
-
-#             # Sort by similarity and take top 3
-#             similarities.sort(key=lambda x: x[0], reverse=True)
-#             for sim, memory in similarities[:3]:
-#                 if sim > 0.9:  # Similarity threshold 0.7 ?
-#                     relevant_memories.append({
-#                         "role": "assistant",
-#                         "content": f"Relevant past context: {memory['summary']}"
-#                     })
-
-#         # Get relevant short-term memories using GPT
-#         if self.short_term_memory:
-#             response = await self.client.chat.completions.create(
-#                 model=MODEL,
-#                 messages=[
-#                     {"role": "system", "content": "Select indices of relevant summaries for the query. Return space-separated numbers only."},
-#                     {"role": "user", "content": f"Query: {query}\n\nSummaries:\n" + "\n".join([f"{i}: {m['summary']}" for i, m in enumerate(self.short_term_memory)])}
-#                 ]
-#             )
-
-#             try:
-#                 indices = [int(i) for i in response.choices[0].message.content.split() if i.isdigit()]
-#                 for idx in indices[:2]:  # Top 2 most relevant
-#                     if idx < len(self.short_term_memory):
-#                         relevant_memories.append({
-#                             "role": "assistant",
-#                             "content": f"Recent context: {self.short_term_memory[idx]['summary']}"
-#                         })
-#             except ValueError:
-#                 print(colored("Error parsing relevant summary indices.", "yellow"))
-
-#         return relevant_memories
-
-#     def get_memory_stats(self):
-#         return {
-#             "immediate_context": len(self.immediate_context),
-#             "short_term_memory": len(self.short_term_memory),
-#             "long_term_memory": len(self.long_term_memory)
-#         }
+    def close(self):
+        self.embeddings_cache.close()
+
+
+class MemoryNamespace:
+    """One session's view of a shared MemorySystem
+
+    Memories are tagged with the namespace and searches are limited to them,
+    while the index, store, embedding cache and batcher are shared with every
+    other namespace of the same system.
+    """
+
+    def __init__(self, memory_system: MemorySystem, namespace: str):
+        self.memory_system = memory_system
+        self.namespace = namespace
+        self.name = memory_system.name
+
+    def __len__(self) -> int:
+        code = self.memory_system.store.tag_code(self.namespace)
+        return int((self.memory_system.store.tags == code).sum()) if code >= 0 else 0
+
+    async def get_embedding(self, text: str) -> List[float]:
+        return await self.memory_system.get_embedding(text)
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self.memory_system.get_embeddings(texts)
+
+    async def store_memory(self, thought: 'Thought'):
+        await self.memory_system.store_memories([thought], namespace=self.namespace)
+
+    async def store_memories(self, thoughts: List['Thought']):
+        await self.memory_system.store_memories(thoughts, namespace=self.namespace)
+
+    def snapshot(self) -> int:
+        return self.memory_system.snapshot()
+
+    async def retrieve_relevant_memories(self, context: Dict, num_memories: int = 3,
+                                         similarity_threshold: float = 0.5, snapshot: int = None) -> List[Dict[str, Any]]:
+        return await self.memory_system.retrieve_relevant_memories(
+            context, num_memories, similarity_threshold, namespace=self.namespace, snapshot=snapshot)
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {}
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        pass
+
+
+class MemorySummarizer(MindComponent):
+    """Summarizes a chunk of memories and rates its long-term importance in one call"""
+
+    def get_system_prompt(self) -> str:
+        return ("You consolidate the memories of a mind. Write a concise summary of these thoughts, "
+                "keeping what would matter later, and rate how important the summary is to remember "
+                "long-term on a scale of 0 to 1.")
+
+    async def summarize(self, thoughts: List[Thought]) -> MemorySummary:
+        prompt = "\n".join(f"- [{thought.source}, {thought.emotion.value}] {thought.content}" for thought in thoughts)
+        return await self._parse(self.get_system_prompt(), prompt, MemorySummary)
+
+
+class TierEntry:
+    """A memory in one tier of HierarchicalMemorySystem, with its unit vector (None until embedded)"""
+
+    def __init__(self, item, vector: np.ndarray = None):
+        self.item = item
+        self.vector = vector
+
+
+class HierarchicalMemorySystem(MemorySystem):
+    """Bounded three-tier memory (see the notes at the top of this file)
+
+    Storing a memory never waits for the model: chunks that leave the immediate
+    context are summarized in background tasks, and `wait_idle` waits for them.
+    """
+
+    def __init__(self, name: str, client, logger, embeddings_cache: EmbeddingCache = None,
+                 immediate_size: int = IMMEDIATE_CONTEXT_SIZE, chunk_size: int = SUMMARY_CHUNK_SIZE,
+                 short_term_size: int = SHORT_TERM_SIZE, long_term_size: int = LONG_TERM_SIZE,
+                 importance_threshold: float = IMPORTANCE_THRESHOLD, **summarizer_options):
+        """
+        Args:
+            immediate_size: Most recent thoughts kept verbatim.
+            chunk_size: Thoughts past the immediate context summarized together.
+            short_term_size: Most recent summaries kept.
+            long_term_size: Most important summaries kept once they leave short-term memory.
+            importance_threshold: Minimum importance for a summary to reach long-term memory.
+            summarizer_options: Passed to the MemorySummarizer (response_cache, use_cache).
+        """
+        self.immediate_size = immediate_size
+        self.chunk_size = chunk_size
+        self.short_term_size = short_term_size
+        self.long_term_size = long_term_size
+        self.importance_threshold = importance_threshold
+        self.summarizer = MemorySummarizer(name, client, **summarizer_options)
+        super().__init__(name, client, logger, embeddings_cache=embeddings_cache)
+
+    def _open_store(self, store: MemoryStore, index: VectorIndex):
+        # Every tier is bounded and kept in memory (and in Mind.state_dict) instead of the store
+        self.immediate: List[TierEntry] = []
+        # Thoughts that left the immediate context, waiting for a full chunk
+        self.overflow: List[TierEntry] = []
+        # Chunks being summarized; still searchable until their summary is in short-term memory
+        self.consolidating: List[List[TierEntry]] = []
+        self.short_term: List[TierEntry] = []
+        self.long_term: List[TierEntry] = []
+        self._tasks = set()
+
+    @property
+    def memories(self) -> List[Thought]:
+        return [self._as_thought(entry, tier) for tier, entries in self._tiers() for entry in entries]
+
+    def namespace(self, namespace: str) -> 'MemoryNamespace':
+        # Tiers belong to one conversation: there is no shared store to tag and mask
+        raise ValueError("HierarchicalMemorySystem cannot be shared between namespaces; "
+                         "use a MemorySystem (memory_mode='flat')")
+
+    def _tiers(self) -> List[Tuple[str, List[TierEntry]]]:
+        pending = [entry for chunk in self.consolidating for entry in chunk]
+        return [('immediate', self.immediate), ('immediate', pending + self.overflow),
+                ('short_term', self.short_term), ('long_term', self.long_term)]
+
+    def _as_thought(self, entry: TierEntry, tier: str) -> Thought:
+        if isinstance(entry.item, Thought):
+            return entry.item
+        return Thought(content=entry.item.summary, source=f"{tier} memory", intensity=entry.item.importance,
+                       emotion=EmotionalState.NEUTRAL, associations=[])
+
+    @staticmethod
+    def _text(entry: TierEntry) -> str:
+        return entry.item.content if isinstance(entry.item, Thought) else entry.item.summary
+
+    async def _embed_missing(self):
+        """Embed entries restored by load_state_dict (usually straight from the embedding cache)"""
+        missing = [entry for _, entries in self._tiers() for entry in entries if entry.vector is None]
+        if missing:
+            embeddings = await self.get_embeddings([self._text(entry) for entry in missing])
+            for entry, vector in zip(missing, normalize(embeddings)):
+                entry.vector = vector
+
+    async def store_memories(self, thoughts: List[Thought]):
+        """Add thoughts to the immediate context, consolidating what falls out of it"""
+        if not thoughts:
+            return
+        for thought in thoughts:
+            EVENTS.info("store_memory", "Storing memory: {content}...", color="yellow", content=thought.content[:50])
+        embeddings = await self.get_embeddings([thought.content for thought in thoughts])
+        self.immediate.extend(TierEntry(thought, vector) for thought, vector in zip(thoughts, normalize(embeddings)))
+
+        excess = len(self.immediate) - self.immediate_size
+        if excess > 0:
+            self.overflow.extend(self.immediate[:excess])
+            del self.immediate[:excess]
+        while len(self.overflow) >= self.chunk_size:
+            chunk = self.overflow[:self.chunk_size]
+            del self.overflow[:self.chunk_size]
+            self.consolidating.append(chunk)
+            task = asyncio.create_task(self._consolidate(chunk))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _consolidate(self, chunk: List[TierEntry]):
+        """Summarize a chunk into short-term memory, promoting what leaves short-term memory"""
+        try:
+            summary = await self.summarizer.summarize([entry.item for entry in chunk])
+            vector = normalize(await self.get_embedding(summary.summary))
+        except Exception as e:
+            EVENTS.error("consolidation_error", "Error consolidating memories: {error}", color="red", error=e)
+            # Keep the thoughts; they are retried with the next chunk
+            self.consolidating.remove(chunk)
+            self.overflow[:0] = chunk
+            return
+        self.consolidating.remove(chunk)
+        summary.importance = min(1.0, max(0.0, summary.importance))
+        self.logger.log_to_file('summaries.jsonl', summary.to_dict())
+        self.short_term.append(TierEntry(summary, vector))
+
+        while len(self.short_term) > self.short_term_size:
+            entry = self.short_term.pop(0)
+            if entry.item.importance >= self.importance_threshold:
+                self.long_term.append(entry)
+        if len(self.long_term) > self.long_term_size:
+            # Keep the most important
+            self.long_term.sort(key=lambda entry: entry.item.importance, reverse=True)
+            del self.long_term[self.long_term_size:]
+
+    async def wait_idle(self):
+        """Wait for pending consolidations"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def snapshot(self) -> List[Tuple[str, TierEntry]]:
+        """The entries of every tier so far (see retrieve_relevant_memories)"""
+        return [(tier, entry) for tier, tier_entries in self._tiers() for entry in tier_entries]
+
+    async def retrieve_relevant_memories(self, context: Dict, num_memories: int = 3,
+                                         similarity_threshold: float = 0.5,
+                                         snapshot: List[Tuple[str, TierEntry]] = None) -> List[Dict[str, Any]]:
+        """Retrieve the most similar thoughts and summaries across every tier
+
+        With a snapshot, only its entries are searched.
+        """
+        EVENTS.info("retrieve", "\n 🔎 Searching for relevant memories...", color="yellow")
+        entries = snapshot if snapshot is not None else self.snapshot()
+        if not entries:
+            return []
+        context_string = self._context_string(context)
+        EVENTS.info("retrieve_context", " L Context: {context}...", color="yellow", attrs=["dark"],
+                    context=context_string[:100])
+        query = normalize(await self.get_embedding(context_string))
+        await self._embed_missing()
+
+        # Every tier is bounded, so an exact search is cheap
+        entries = [(tier, entry) for tier, entry in entries if entry.vector is not None]
+        if not entries:
+            return []
+        scores = np.stack([entry.vector for _, entry in entries]) @ query
+        matches = top_k(np.arange(len(entries)), scores, num_memories, similarity_threshold)
+        return [self._as_thought(entries[i][1], entries[i][0]) for i, _ in matches]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'immediate': len(self.immediate),
+            'overflow': len(self.overflow) + sum(len(chunk) for chunk in self.consolidating),
+            'short_term': len(self.short_term),
+            'long_term': len(self.long_term),
+            'consolidating': len(self._tasks),
+        }
+
+    def state_dict(self) -> Dict[str, Any]:
+        """Tier contents without embeddings; chunks still being summarized are saved as overflow"""
+        pending = [entry for chunk in self.consolidating for entry in chunk]
+        return {
+            'immediate': [entry.item.model_dump(mode='json') for entry in self.immediate],
+            'overflow': [entry.item.model_dump(mode='json') for entry in pending + self.overflow],
+            'short_term': [entry.item.model_dump(mode='json') for entry in self.short_term],
+            'long_term': [entry.item.model_dump(mode='json') for entry in self.long_term],
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]):
+        """Restore the tiers saved by state_dict; embeddings are fetched on the next search"""
+        if not state:
+            return
+        self.immediate = [TierEntry(Thought.model_validate(item)) for item in state['immediate']]
+        self.overflow = [TierEntry(Thought.model_validate(item)) for item in state['overflow']]
+        self.consolidating = []
+        self.short_term = [TierEntry(MemorySummary.model_validate(item)) for item in state['short_term']]
+        self.long_term = [TierEntry(MemorySummary.model_validate(item)) for item in state['long_term']]
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+# Declarative DAG executor for the Mind turn pipeline
+# Each stage names the values it consumes (inputs) and the values it produces
+# (outputs). A run starts every stage as soon as all of its inputs are
+# available, so independent stages overlap instead of running in a fixed order.
+
+
+class Stage:
+    """A pipeline step
+
+    Args:
+        name: Unique stage name, used for timings.
+        fn: Async callable receiving the inputs as keyword arguments. With one output
+            its return value is that output; with several it must return a tuple.
+        inputs: Names of the values the stage needs.
+        outputs: Names of the values the stage produces.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Awaitable[Any]],
+                 inputs: Sequence[str] = (), outputs: Sequence[str] = ()):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    async def run(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self.fn(**{name: values[name] for name in self.inputs})
+        if not self.outputs:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        return dict(zip(self.outputs, result))
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self._validate()
+
+    def _validate(self):
+        """Reject duplicate names/outputs and dependency cycles"""
+        names, producers = set(), {}
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            names.add(stage.name)
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"'{output}' is produced by both {producers[output]} and {stage.name}")
+                producers[output] = stage.name
+
+        # Kahn's algorithm over stage -> stage edges; external inputs have no producer
+        remaining = {stage.name: {producers[i] for i in stage.inputs if i in producers} for stage in self.stages}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle between stages: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    async def run(self, **inputs) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Run all stages; returns (all values, per-stage wall time in seconds)"""
+        values = dict(inputs)
+        timings: Dict[str, float] = {}
+        pending = list(self.stages)
+        running: Dict[asyncio.Task, Stage] = {}
+
+        async def timed(stage: Stage):
+            start = time.perf_counter()
+            try:
+                return await stage.run(values)
+            finally:
+                timings[stage.name] = time.perf_counter() - start
+
+        try:
+            while pending or running:
+                for stage in [s for s in pending if all(i in values for i in s.inputs)]:
+                    pending.remove(stage)
+                    running[asyncio.create_task(timed(stage))] = stage
+                if not running:
+                    missing = sorted({i for s in pending for i in s.inputs if i not in values})
+                    raise ValueError(f"Pipeline inputs never provided: {missing}")
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    running.pop(task)
+                    values.update(task.result())
+        finally:
+            for task in running:
+                task.cancel()
+        return values, timings
@@ -0,0 +1,313 @@
+import asyncio
+import email.utils
+import inspect
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import openai
+
+from components import call_client
+from metrics import METRICS
+
+# Rate limiting and retries for the shared OpenAI client
+# RateLimitedClient wraps an OpenAI or AsyncOpenAI client and exposes the
+# endpoints the mind uses (beta.chat.completions.parse and stream,
+# embeddings.create) as async methods. Every call:
+# 1. waits for a slot (at most `max_concurrency` requests in flight),
+# 2. takes one request from the requests/min bucket and its estimated tokens
+#    from the tokens/min bucket, sleeping only as long as the buckets need.
+#    A bucket holds up to `burst` units and refills at `rate - burst` per
+#    minute, so no 60 second window (the first one included) ever goes over
+#    the quota: the burst comes out of the minute, not on top of it,
+# 3. retries 429/408/409/5xx and connection errors with jittered exponential
+#    backoff, waiting at least as long as a Retry-After header asks.
+# Token estimates come from tiktoken when it is installed (len/4 otherwise);
+# the tokens bucket is corrected with the real usage once the response arrives.
+# A 429 halves the effective rates and each success wins some of it back, so a
+# quota shared with other processes is found without repeated errors.
+# A stream (RateLimitedStream) takes its quota and slot when it is opened and
+# keeps the slot until it is closed. Opening it is retried like any call; an
+# error once events are flowing is raised, since they were already reported.
+
+# Build the wrapped client with max_retries=0 so retries are not done twice:
+#   client = RateLimitedClient(AsyncOpenAI(max_retries=0), rpm=500, tpm=200_000)
+
+RETRYABLE_STATUS = {408, 409, 429}
+COMPLETION_TOKEN_ESTIMATE = 512
+MIN_RATE_SCALE = 0.1
+RATE_RECOVERY = 0.02
+_STREAM_END = object()
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str):
+    """tiktoken encoding for a model, or None when tiktoken is not installed"""
+    if model not in _encodings:
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model] = None
+        else:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def estimate_chat_tokens(model: str, messages: List[Dict[str, str]], max_tokens: int = None) -> int:
+    """Prompt tokens plus the completion budget, as counted against tokens/min"""
+    prompt = sum(count_tokens(message.get("content") or "", model) + 4 for message in messages) + 3
+    return prompt + (max_tokens or COMPLETION_TOKEN_ESTIMATE)
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    milliseconds = headers.get("retry-after-ms")
+    if milliseconds:
+        try:
+            return float(milliseconds) / 1000
+        except ValueError:
+            pass
+    seconds = headers.get("retry-after")
+    if not seconds:
+        return None
+    try:
+        return float(seconds)
+    except ValueError:
+        retry_at = email.utils.parsedate_to_datetime(seconds)
+        return max(0.0, retry_at.timestamp() - time.time()) if retry_at else None
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in RETRYABLE_STATUS or (status is not None and status >= 500)
+
+
+class TokenBucket:
+    """Bucket that lets at most `rate` units through in any 60 second window
+
+    Holds at most `burst` units, so an idle client cannot fire a whole minute of
+    quota at once, and refills at `rate - burst` per minute, so a full bucket
+    plus a minute of refill is still within `rate`. Waiters are served in
+    arrival order.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or rate / 2
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def refill_rate(self) -> float:
+        """Units per minute; at least half the rate when the burst is large relative to it"""
+        return max(self.rate - self.burst, self.rate / 2)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.refill_rate / 60)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """Take `amount` units, sleeping until they are available; returns seconds waited"""
+        # A request larger than the bucket waits for a full bucket and overdraws it
+        needed = min(amount, self.burst)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < needed:
+                delay = (needed - self.tokens) * 60 / self.refill_rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= amount
+        return waited
+
+    def refund(self, amount: float):
+        """Give back (or, if negative, take) units once the real cost is known"""
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + amount)
+
+
+class RateLimitedStream:
+    """Async stream manager that opens the wrapped client's stream under the rate limits
+
+    A synchronous client's stream is opened and read in worker threads.
+    """
+
+    def __init__(self, limiter: 'RateLimitedClient', method, estimated_tokens: int, kwargs: Dict[str, Any]):
+        self.limiter = limiter
+        self.method = method
+        self.estimated_tokens = estimated_tokens
+        self.kwargs = kwargs
+        self._manager = None
+        self._stream = None
+
+    async def _open(self):
+        manager = self.method(**self.kwargs)
+        if hasattr(manager, "__aenter__"):
+            return manager, await manager.__aenter__()
+        return manager, await asyncio.to_thread(manager.__enter__)
+
+    async def __aenter__(self) -> 'RateLimitedStream':
+        await self.limiter._slots.acquire()
+        try:
+            self._manager, self._stream = await self.limiter._attempt(self._open, self.estimated_tokens)
+        except BaseException:
+            self.limiter._slots.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        try:
+            if hasattr(self._manager, "__aexit__"):
+                return await self._manager.__aexit__(*exc_info)
+            return await asyncio.to_thread(self._manager.__exit__, *exc_info)
+        finally:
+            self.limiter._slots.release()
+
+    def __aiter__(self):
+        if hasattr(self._stream, "__aiter__"):
+            return self._stream.__aiter__()
+        return self._iterate_sync()
+
+    async def _iterate_sync(self):
+        events = iter(self._stream)
+        while (event := await asyncio.to_thread(next, events, _STREAM_END)) is not _STREAM_END:
+            yield event
+
+    async def get_final_completion(self):
+        if inspect.iscoroutinefunction(self._stream.get_final_completion):
+            completion = await self._stream.get_final_completion()
+        else:
+            completion = await asyncio.to_thread(self._stream.get_final_completion)
+        self.limiter._settle(self.estimated_tokens, completion)
+        return completion
+
+
+class RateLimitedClient:
+    def __init__(self, client, rpm: float = None, tpm: float = None, max_concurrency: int = 16,
+                 max_retries: int = 6, base_backoff: float = 0.5, max_backoff: float = 30.0,
+                 burst_seconds: float = 2.0):
+        """
+        Args:
+            client: OpenAI or AsyncOpenAI client (ideally with max_retries=0).
+            rpm, tpm: Requests and tokens per minute; None leaves that limit off.
+            max_concurrency: Requests in flight at once.
+            max_retries: Retries per call before the error is raised.
+            burst_seconds: Seconds of quota that can be spent at once after idling; the
+                sustained rate is that much under the quota (see TokenBucket).
+        """
+        self.client = client
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.requests = TokenBucket(rpm, max(1.0, rpm * burst_seconds / 60)) if rpm else None
+        self.tokens = TokenBucket(tpm, max(1.0, tpm * burst_seconds / 60)) if tpm else None
+        self.rate_scale = 1.0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.stats_counts = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'errors': 0}
+        self.throttled_seconds = 0.0
+
+        completions = SimpleNamespace(parse=self._parse)
+        if hasattr(client.beta.chat.completions, "stream"):
+            completions.stream = self._stream
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        self.embeddings = SimpleNamespace(create=self._embeddings_create)
+
+    def _scale_rates(self, factor: float):
+        """Adjust the effective rates (AIMD: halve on 429, recover slowly on success)"""
+        self.rate_scale = min(1.0, max(MIN_RATE_SCALE, factor))
+        if self.requests:
+            self.requests.rate = self.rpm * self.rate_scale
+        if self.tokens:
+            self.tokens.rate = self.tpm * self.rate_scale
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        server_delay = retry_after(exc)
+        if server_delay is not None:
+            delay = server_delay + random.uniform(0, self.base_backoff)
+        return delay
+
+    def _settle(self, estimated_tokens: int, response):
+        """Correct the tokens bucket with the response's real usage"""
+        usage = getattr(response, "usage", None)
+        if self.tokens and usage is not None and getattr(usage, "total_tokens", None) is not None:
+            self.tokens.refund(estimated_tokens - usage.total_tokens)
+
+    async def _call(self, method, estimated_tokens: int, **kwargs):
+        async with self._slots:
+            return await self._attempt(method, estimated_tokens, **kwargs)
+
+    async def _attempt(self, method, estimated_tokens: int, **kwargs):
+        """Take quota and call `method`, retrying retryable errors (slot already held)"""
+        for attempt in range(self.max_retries + 1):
+            waited = 0.0
+            if self.requests:
+                waited += await self.requests.acquire(1)
+            if self.tokens:
+                waited += await self.tokens.acquire(estimated_tokens)
+            self.throttled_seconds += waited
+            METRICS.observe("rate_limiter_wait_seconds", waited)
+            self.stats_counts['requests'] += 1
+            try:
+                response = await call_client(method, **kwargs)
+            except Exception as exc:
+                if self.tokens:
+                    # A failed request is not billed; a 429 still counts against the minute
+                    self.tokens.refund(0 if getattr(exc, "status_code", None) == 429 else estimated_tokens)
+                if not is_retryable(exc) or attempt == self.max_retries:
+                    self.stats_counts['errors'] += 1
+                    raise
+                if getattr(exc, "status_code", None) == 429:
+                    self.stats_counts['rate_limited'] += 1
+                    self._scale_rates(self.rate_scale / 2)
+                self.stats_counts['retries'] += 1
+                METRICS.inc("llm_retries_total", status=getattr(exc, "status_code", None) or "connection")
+                await asyncio.sleep(self._backoff(attempt, exc))
+                continue
+
+            self._settle(estimated_tokens, response)
+            if self.rate_scale < 1.0:
+                self._scale_rates(self.rate_scale + RATE_RECOVERY)
+            return response
+
+    @staticmethod
+    def _estimate_chat(kwargs: Dict[str, Any]) -> int:
+        max_tokens = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens")
+        return estimate_chat_tokens(kwargs["model"], kwargs["messages"], max_tokens)
+
+    async def _parse(self, **kwargs):
+        return await self._call(self.client.beta.chat.completions.parse, self._estimate_chat(kwargs), **kwargs)
+
+    def _stream(self, **kwargs) -> RateLimitedStream:
+        return RateLimitedStream(self, self.client.beta.chat.completions.stream, self._estimate_chat(kwargs), kwargs)
+
+    async def _embeddings_create(self, **kwargs):
+        texts = kwargs["input"]
+        texts = [texts] if isinstance(texts, str) else texts
+        estimated = sum(count_tokens(text, kwargs["model"]) for text in texts)
+        return await self._call(self.client.embeddings.create, estimated, **kwargs)
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.stats_counts, 'throttled_seconds': round(self.throttled_seconds, 3),
+                'rate_scale': round(self.rate_scale, 3)}
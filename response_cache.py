@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+# Structured-output response cache
+# Keyed by (component, model, system prompt, user prompt, response_format schema
+# hash), so a repeated request for the same structured output skips the network
+# entirely. The component name is part of the key as a deliberate workaround:
+# generate_thought (components.py) calls the base create_prompt and
+# get_system_prompt, never the controllers' _create_prompt/_get_system_prompt
+# overrides, so EmotionalProcessor and RationalAnalyzer send identical prompts
+# and would otherwise share one cached thought. Revisit the key once those
+# prompt hooks are fixed and the prompts themselves differ.
+# Two tiers:
+# - Memory: LRU of the last `max_entries` responses.
+# - Disk (optional): SQLite table, shared across restarts and test replays.
+# Values are stored as JSON and re-validated on every hit, so callers always get
+# a fresh Pydantic object they are free to mutate.
+
+
+class ResponseCache:
+    def __init__(self, path: str = None, max_entries: int = 1024, ttl: float = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lru: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._schema_hashes: Dict[Type[BaseModel], str] = {}
+        self._db = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, created_at REAL)"
+            )
+        return self._db
+
+    def _schema_hash(self, response_format: Type[BaseModel]) -> str:
+        if response_format not in self._schema_hashes:
+            schema = json.dumps(response_format.model_json_schema(), sort_keys=True)
+            self._schema_hashes[response_format] = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+        return self._schema_hashes[response_format]
+
+    def key(self, component: str, model: str, system_prompt: str, prompt: str,
+            response_format: Type[BaseModel]) -> str:
+        parts = [component, model, system_prompt, prompt, self._schema_hash(response_format)]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def get(self, key: str, response_format: Type[BaseModel]) -> Optional[BaseModel]:
+        entry = self._lru.get(key)
+        if entry is not None:
+            self._lru.move_to_end(key)
+        else:
+            db = self._connection()
+            row = db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone() if db else None
+            if row is not None:
+                entry = (row[0], row[1])
+                self._remember(key, entry)
+
+        if entry is None or self._expired(entry[1]):
+            if entry is not None:
+                self._evict(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response_format.model_validate_json(entry[0])
+
+    def put(self, key: str, value: BaseModel):
+        entry = (value.model_dump_json(), time.time())
+        self._remember(key, entry)
+        db = self._connection()
+        if db is not None:
+            db.execute("INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)", (key, *entry))
+            db.commit()
+
+    def _remember(self, key: str, entry: Tuple[str, float]):
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _evict(self, key: str):
+        self._lru.pop(key, None)
+        db = self._connection()
+        if db is not None:
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
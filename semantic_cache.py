@@ -0,0 +1,93 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+
+from vector_index import normalize
+
+# Semantic (embedding-similarity) cache for component results
+# Near-duplicate situations ("ok", "tell me more", paraphrases) reuse the
+# result a component produced for an earlier situation, when the cosine
+# similarity of the two situation embeddings is at least `threshold`.
+# Results are stored and looked up per component name, so components never
+# receive each other's results for the same situation.
+# Holds the last `max_entries` situations in a ring buffer.
+# stats() reports hit rates and a histogram of the best similarity seen per
+# lookup, which shows how many more hits a lower threshold would give.
+
+SIMILARITY_BUCKETS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0]
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1024):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors = None
+        self._results: List[Dict[str, Any]] = []
+        self._next = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.best_similarity = np.zeros(len(SIMILARITY_BUCKETS) + 1, dtype=np.int64)
+
+    def _best_match(self, component: str, query: np.ndarray):
+        """Return (slot, similarity) of the closest situation with a result for this component"""
+        if self._vectors is None or not self._results:
+            return None, -1.0
+        scores = self._vectors[:len(self._results)] @ query
+        has_result = np.array([component in results for results in self._results])
+        if not has_result.any():
+            return None, -1.0
+        scores = np.where(has_result, scores, -np.inf)
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+    def lookup(self, component: str, embedding: Sequence[float]) -> Optional[Any]:
+        """Return a copy of the cached result for a similar situation, or None"""
+        slot, similarity = self._best_match(component, normalize(embedding))
+        self.best_similarity[np.searchsorted(SIMILARITY_BUCKETS, similarity, side='right')] += 1
+        if slot is None or similarity < self.threshold:
+            self.misses[component] = self.misses.get(component, 0) + 1
+            return None
+        self.hits[component] = self.hits.get(component, 0) + 1
+        result = self._results[slot][component]
+        return result.model_copy(deep=True) if isinstance(result, BaseModel) else result
+
+    def store(self, component: str, embedding: Sequence[float], result: Any):
+        """Remember a component's result for a situation"""
+        vector = normalize(embedding)
+        slot = None
+        if self._results:
+            scores = self._vectors[:len(self._results)] @ vector
+            best = int(np.argmax(scores))
+            # The same situation seen again only adds this component's result
+            if scores[best] >= 1 - 1e-6:
+                slot = best
+
+        if slot is None:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._next
+            self._next = (self._next + 1) % self.max_entries
+            self._vectors[slot] = vector
+            if slot < len(self._results):
+                self._results[slot] = {}
+            else:
+                self._results.append({})
+        self._results[slot][component] = result
+
+    def stats(self) -> Dict[str, Any]:
+        components = sorted(set(self.hits) | set(self.misses))
+        per_component = {}
+        for component in components:
+            hits, misses = self.hits.get(component, 0), self.misses.get(component, 0)
+            per_component[component] = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+        total_hits, total_misses = sum(self.hits.values()), sum(self.misses.values())
+        lookups = total_hits + total_misses
+        labels = [f"<{b}" for b in SIMILARITY_BUCKETS] + [f">={SIMILARITY_BUCKETS[-1]}"]
+        return {
+            'threshold': self.threshold,
+            'entries': len(self._results),
+            'hit_rate': total_hits / lookups if lookups else 0.0,
+            'components': per_component,
+            'best_similarity': dict(zip(labels, self.best_similarity.tolist())),
+        }
@@ -0,0 +1,339 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from termcolor import colored
+
+from components import MindLogger
+from events import EVENTS
+from metrics import METRICS
+from mind import Mind
+from ms import LOG_MAX_BYTES, LOG_RETENTION, SAVE_DIR, MemorySystem
+
+# Multi-session Mind server
+# One process serves many conversations. Each session gets its own Mind (state,
+# beliefs, questions and logs under <save_dir>/sessions/<id>), while all of them
+# share:
+# - the OpenAI client (and its rate limiter, if any),
+# - one MemorySystem: a single store, index and embedding cache. Each session's
+#   memories are tagged with its id and searches only see its own
+#   (MemorySystem.namespace),
+# - the response and semantic caches, when enabled,
+# - one buffered MindLogger (one writer thread); each session logs through a
+#   view of it into its own directory.
+# Turns of one session run one at a time; different sessions run concurrently.
+# Sessions idle for `idle_timeout` seconds (or the least recently used, beyond
+# `max_sessions`) are evicted: their state is written to
+# sessions/<id>/session.json and the Mind is closed. The next request for that
+# session restores it from disk.
+
+# Usage:
+#   uvicorn server:app                      (OPENAI_API_KEY and cache flags from .env, as in main.py)
+#   python server.py --port 8000 --fake     (offline, with fake_client)
+# Per-turn progress events are off by default (EVENT_LEVEL=info to see them, see events.py).
+# Endpoints:
+#   POST   /sessions                    {"initial_situation": "..."}  -> {"session_id": "..."}
+#   POST   /sessions/{id}/turns         {"situation": "..."}          -> {"question": "...", "stage_timings": {...}}
+#   DELETE /sessions/{id}
+#   GET    /stats
+#   GET    /metrics                     Prometheus text (see metrics.py)
+
+SESSION_IDLE_TIMEOUT = 600 # in seconds
+MAX_SESSIONS = 1000 # minds kept in memory at once
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Options of main.mind_options() that apply to sessions
+SESSION_OPTIONS = ('response_cache', 'uncached_components', 'semantic_cache', 'semantic_beliefs')
+
+
+class Session:
+    def __init__(self, session_id: str, mind: Mind):
+        self.id = session_id
+        self.mind = mind
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.evicted = False
+
+
+class SessionManager:
+    def __init__(self, client, save_dir: str = SAVE_DIR, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 max_sessions: int = MAX_SESSIONS, sweep_interval: float = None, **mind_options):
+        """
+        Args:
+            client: OpenAI/AsyncOpenAI client (or a wrapper) shared by every session.
+            idle_timeout: Seconds without a turn before a session is evicted to disk.
+            max_sessions: Sessions kept in memory; the least recently used is evicted beyond it.
+            sweep_interval: Seconds between idle sweeps (default: idle_timeout / 4).
+            mind_options: Passed to every Mind (response_cache, semantic_cache, ...).
+        """
+        self.client = client
+        self.save_dir = save_dir
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval or idle_timeout / 4
+        if mind_options.get('memory_mode', 'flat') != 'flat':
+            raise ValueError("Sessions share one flat MemorySystem; memory_mode must be 'flat'")
+        self.mind_options = mind_options
+        self.logger = MindLogger(save_dir, buffered=True, max_bytes=LOG_MAX_BYTES, retention=LOG_RETENTION)
+        self.memory = MemorySystem('memory', client, self.logger)
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+        self.counts = {'created': 0, 'turns': 0, 'evicted': 0, 'restored': 0}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _session_dir(self, session_id: str) -> str:
+        return os.path.join(self.save_dir, "sessions", session_id)
+
+    def _state_path(self, session_id: str) -> str:
+        return os.path.join(self._session_dir(session_id), "session.json")
+
+    def _new_mind(self, session_id: str) -> Mind:
+        return Mind(self.client, save_dir=self._session_dir(session_id),
+                    logger=self.logger.view(os.path.relpath(self._session_dir(session_id), self.save_dir)),
+                    memory=self.memory.namespace(session_id), **self.mind_options)
+
+    def start(self):
+        """Start evicting idle sessions in the background (needs a running event loop)"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    def _add(self, session: Session):
+        self.sessions[session.id] = session
+        self.sessions.move_to_end(session.id)
+        self._enforce_capacity(keep=session)
+
+    def _enforce_capacity(self, keep: Session = None):
+        """Evict the least recently used sessions beyond max_sessions
+
+        Sessions mid-turn are skipped; every turn calls this again when it ends,
+        so they are evicted then if still over capacity.
+        """
+        for other in list(self.sessions.values()):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if other is not keep and not other.lock.locked():
+                self._evict(other)
+
+    def create_session(self, initial_situation: str = None) -> str:
+        session_id = uuid.uuid4().hex
+        mind = self._new_mind(session_id)
+        mind.initial_situation = initial_situation
+        self._add(Session(session_id, mind))
+        self.counts['created'] += 1
+        return session_id
+
+    def get_session(self, session_id: str) -> Session:
+        """Return a live session, restoring it from disk if it was evicted"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.move_to_end(session_id)
+            return session
+        if not SESSION_ID.match(session_id) or not os.path.exists(self._state_path(session_id)):
+            raise KeyError(session_id)
+        with open(self._state_path(session_id), 'r') as f:
+            state = json.load(f)
+        mind = self._new_mind(session_id)
+        mind.load_state_dict(state)
+        session = Session(session_id, mind)
+        self._add(session)
+        self.counts['restored'] += 1
+        return session
+
+    async def process(self, session_id: str, situation: str) -> Tuple[str, Dict[str, float]]:
+        """Run one turn of a session and return its question and stage timings"""
+        while True:
+            session = self.get_session(session_id)
+            async with session.lock:
+                # Evicted while this turn waited for the previous one: restore and retry
+                if session.evicted:
+                    continue
+                if session.mind.initial_situation is None:
+                    session.mind.initial_situation = situation
+                question = await session.mind.process_situation(situation)
+                session.last_used = time.monotonic()
+                self.counts['turns'] += 1
+                timings = session.mind.stage_timings
+            self._enforce_capacity(keep=session)
+            return question, timings
+
+    def _evict(self, session: Session):
+        """Save a session's state to disk and release its Mind"""
+        path = self._state_path(session.id)
+        temporary = path + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump(session.mind.state_dict(), f)
+        os.replace(temporary, path)
+        session.mind.close(shared=False)
+        session.evicted = True
+        self.sessions.pop(session.id, None)
+        self.counts['evicted'] += 1
+
+    def evict_idle(self) -> int:
+        """Evict sessions idle for longer than idle_timeout; returns how many"""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [s for s in self.sessions.values() if s.last_used < cutoff and not s.lock.locked()]
+        for session in idle:
+            self._evict(session)
+        return len(idle)
+
+    def delete_session(self, session_id: str):
+        """Forget a session's state (its memories stay in the shared store, tagged with its id)"""
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.mind.close(shared=False)
+            session.evicted = True
+        elif not SESSION_ID.match(session_id) or not os.path.exists(self._state_path(session_id)):
+            raise KeyError(session_id)
+        if os.path.exists(self._state_path(session_id)):
+            os.remove(self._state_path(session_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counts, 'active': len(self.sessions), 'memories': len(self.memory.memories)}
+
+    async def close(self):
+        """Stop sweeping, save every live session and close the shared resources"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for session in list(self.sessions.values()):
+            self._evict(session)
+        self.memory.close()
+        self.logger.close()
+        if self.mind_options.get('response_cache') is not None:
+            self.mind_options['response_cache'].close()
+
+
+def create_app(manager: SessionManager):
+    from contextlib import asynccontextmanager
+
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import PlainTextResponse
+    from pydantic import BaseModel
+
+    class SessionRequest(BaseModel):
+        initial_situation: Optional[str] = None
+
+    class TurnRequest(BaseModel):
+        situation: str
+
+    @asynccontextmanager
+    async def lifespan(app):
+        manager.start()
+        try:
+            yield
+        finally:
+            await manager.close()
+
+    app = FastAPI(title="Mind server", lifespan=lifespan)
+    app.state.manager = manager
+
+    @app.post("/sessions")
+    async def create_session(request: SessionRequest):
+        return {'session_id': manager.create_session(request.initial_situation)}
+
+    @app.post("/sessions/{session_id}/turns")
+    async def turn(session_id: str, request: TurnRequest):
+        try:
+            question, timings = await manager.process(session_id, request.situation)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Unknown session")
+        return {'question': question, 'stage_timings': timings}
+
+    @app.delete("/sessions/{session_id}")
+    async def delete_session(session_id: str):
+        try:
+            manager.delete_session(session_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Unknown session")
+        return {'deleted': session_id}
+
+    @app.get("/stats")
+    async def stats():
+        return manager.stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return METRICS.prometheus()
+
+    return app
+
+
+def session_options() -> Dict[str, Any]:
+    """Mind keyword arguments for sessions: the caches enabled in the environment
+
+    STREAM_OUTPUT (a console printer), MEMORY_MODE and CHECKPOINT_INTERVAL are
+    for the single-mind CLI and do not apply: sessions share one flat memory
+    system and are saved to disk on eviction.
+    """
+    from main import mind_options
+
+    options = mind_options()
+    return {**{key: options[key] for key in SESSION_OPTIONS}, 'memory_mode': 'flat'}
+
+
+def create_default_app():
+    """App configured from the environment, like main.py"""
+    from dotenv import load_dotenv
+
+    from main import create_client
+
+    load_dotenv()
+    EVENTS.configure_from_env(default_level="off")
+    return create_app(SessionManager(create_client(), **session_options()))
+
+
+_app = None
+
+
+def __getattr__(name: str):
+    # `uvicorn server:app` builds the app on first access, so importing this module stays cheap
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_default_app()
+        return _app
+    raise AttributeError(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many Mind sessions over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--save-dir", default=SAVE_DIR)
+    parser.add_argument("--idle-timeout", type=float, default=SESSION_IDLE_TIMEOUT)
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--fake", action="store_true", help="Use the offline fake client")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    # Per-turn progress output is off unless EVENT_LEVEL asks for it
+    EVENTS.configure_from_env(default_level="off")
+
+    if args.fake:
+        from fake_client import AsyncFakeOpenAI
+        client, options = AsyncFakeOpenAI(), {}
+    else:
+        from dotenv import load_dotenv
+
+        from main import create_client
+        load_dotenv()
+        client, options = create_client(), session_options()
+
+    manager = SessionManager(client, save_dir=args.save_dir, idle_timeout=args.idle_timeout,
+                             max_sessions=args.max_sessions, **options)
+    print(colored(f"Serving Mind sessions on http://{args.host}:{args.port}", "green"))
+    uvicorn.run(create_app(manager), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from termcolor import colored
+
+from benchmark import SITUATIONS, percentile
+from events import EVENTS, OFF
+from fake_client import AsyncFakeOpenAI
+from server import SessionManager, create_app
+
+# Load test for server.py
+# Runs many concurrent conversations against the FastAPI app in process
+# (httpx ASGI transport, no sockets) with the deterministic fake client.
+# Each simulated user creates a session and sends `--turns` situations, pausing
+# `--think-time` seconds between them. A short `--idle-timeout` or a small
+# `--max-sessions` exercises eviction to disk and restore.
+# Reports completed sessions/second and p50/p99/max turn latency.
+
+# Usage:
+#   python server_loadtest.py --sessions 200 --concurrency 50 --turns 5
+#   python server_loadtest.py --sessions 100 --max-sessions 20 --latency 0.2
+
+
+async def user(http, situations: List[str], turns: int, think_time: float, rng: random.Random,
+               latencies: List[float]):
+    response = await http.post("/sessions", json={'initial_situation': rng.choice(situations)})
+    response.raise_for_status()
+    session_id = response.json()['session_id']
+    for _ in range(turns):
+        start = time.perf_counter()
+        response = await http.post(f"/sessions/{session_id}/turns", json={'situation': rng.choice(situations)})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+
+async def run_loadtest(args) -> Dict:
+    import httpx
+
+    save_dir = args.save_dir or tempfile.mkdtemp(prefix="mind_server_loadtest_")
+    client = AsyncFakeOpenAI(latency=args.latency, jitter=args.jitter, embedding_latency=args.embedding_latency)
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def limited_user(http):
+        async with gate:
+            await user(http, SITUATIONS, args.turns, args.think_time, random.Random(rng.random()), latencies)
+
+    output = contextlib.nullcontext() if args.show_output else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with output:
+        manager = SessionManager(client, save_dir=save_dir, idle_timeout=args.idle_timeout,
+                                 max_sessions=args.max_sessions, sweep_interval=args.idle_timeout / 2)
+        transport = httpx.ASGITransport(app=create_app(manager))
+        manager.start()
+        async with httpx.AsyncClient(transport=transport, base_url="http://mind", timeout=None) as http:
+            start = time.perf_counter()
+            await asyncio.gather(*(limited_user(http) for _ in range(args.sessions)))
+            elapsed = time.perf_counter() - start
+            stats = (await http.get("/stats")).json()
+        await manager.close()
+
+    return {
+        'sessions': args.sessions,
+        'turns': len(latencies),
+        'seconds': elapsed,
+        'sessions_per_second': args.sessions / elapsed,
+        'turns_per_second': len(latencies) / elapsed,
+        'turn_ms': {'p50': percentile(latencies, 50) * 1000, 'p99': percentile(latencies, 99) * 1000,
+                    'max': max(latencies) * 1000 if latencies else 0.0},
+        'server': stats,
+        'client_calls': dict(client.calls),
+        'save_dir': save_dir,
+    }
+
+
+def print_report(report: Dict):
+    print(colored(f"\n{report['sessions']} sessions, {report['turns']} turns in {report['seconds']:.2f} s "
+                  f"(state in {report['save_dir']})", "green"))
+    print(f"throughput     {report['sessions_per_second']:.1f} sessions/s, {report['turns_per_second']:.1f} turns/s")
+    turn = report['turn_ms']
+    print(f"turn latency   p50 {turn['p50']:8.2f} ms   p99 {turn['p99']:8.2f} ms   max {turn['max']:8.2f} ms")
+    print(f"server         {report['server']}")
+    print(f"client calls   {report['client_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Mind server")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session")
+    parser.add_argument("--concurrency", type=int, default=50, help="Sessions in progress at once")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between a user's turns")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per completion call")
+    parser.add_argument("--embedding-latency", type=float, default=None)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--idle-timeout", type=float, default=30.0)
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-dir", help="Defaults to a fresh temporary directory")
+    parser.add_argument("--show-output", action="store_true", help="Keep the minds' console output")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if not args.show_output:
+        EVENTS.configure(level=OFF)
+    report = asyncio.run(run_loadtest(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
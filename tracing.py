@@ -0,0 +1,97 @@
+import os
+import threading
+from typing import Sequence
+
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter, SpanExportResult
+)
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+# Tracing setup for smolagents/LLM instrumentation
+# Spans are handed to a BatchSpanProcessor: the instrumented thread only appends
+# the finished span to a bounded in-memory queue, and a background thread exports
+# batches. When the queue is full new spans are dropped rather than blocking the
+# caller. Sampling is decided per trace (children follow their parent).
+
+# Exporters:
+# - otlp: HTTP to Phoenix or any OTLP collector (endpoint)
+# - file: JSON lines on local disk, for offline runs
+# - memory: kept in process, for tests and benchmarks (provider.memory_exporter)
+# - console: pretty-printed to stdout
+
+TRACING_ENDPOINT = "http://0.0.0.0:6006/v1/traces"
+TRACING_FILE = "mind_logs/traces.jsonl"
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends each span as one JSON line to a local file"""
+
+    def __init__(self, path: str = TRACING_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        with self._lock:
+            self._file.write(lines)
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def create_exporter(exporter: str, endpoint: str = TRACING_ENDPOINT, file_path: str = TRACING_FILE) -> SpanExporter:
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint)
+    if exporter == "file":
+        return JsonLinesSpanExporter(file_path)
+    if exporter == "memory":
+        return InMemorySpanExporter()
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown tracing exporter: {exporter}")
+
+
+def setup_tracing(exporter: str = "otlp", endpoint: str = TRACING_ENDPOINT, file_path: str = TRACING_FILE,
+                  sample_ratio: float = 1.0, max_queue_size: int = 2048, max_export_batch_size: int = 512,
+                  schedule_delay_millis: float = 5000, batch: bool = True,
+                  instrument_smolagents: bool = True) -> TracerProvider:
+    """Create a tracer provider with a batching, sampling span pipeline
+
+    Args:
+        exporter: 'otlp', 'file', 'memory' or 'console'.
+        sample_ratio: Fraction of traces recorded (0-1).
+        max_queue_size: Spans buffered before new ones are dropped.
+        max_export_batch_size: Spans per export call.
+        schedule_delay_millis: Longest time a span waits before being exported.
+        batch: Set to False to export synchronously on the calling thread (debugging only).
+        instrument_smolagents: Hook the provider into smolagents via openinference.
+    """
+    trace_provider = TracerProvider(sampler=ParentBased(TraceIdRatioBased(sample_ratio)))
+    span_exporter = create_exporter(exporter, endpoint, file_path)
+    if batch:
+        processor = BatchSpanProcessor(
+            span_exporter,
+            max_queue_size=max_queue_size,
+            max_export_batch_size=min(max_export_batch_size, max_queue_size),
+            schedule_delay_millis=schedule_delay_millis,
+        )
+    else:
+        processor = SimpleSpanProcessor(span_exporter)
+    trace_provider.add_span_processor(processor)
+    if isinstance(span_exporter, InMemorySpanExporter):
+        trace_provider.memory_exporter = span_exporter
+
+    if instrument_smolagents:
+        from openinference.instrumentation.smolagents import SmolagentsInstrumentor
+        SmolagentsInstrumentor().instrument(tracer_provider=trace_provider)
+    return trace_provider
@@ -0,0 +1,232 @@
+import numpy as np
+from typing import List, Sequence, Tuple
+
+# Vector indexes for MemorySystem
+# Every index stores unit-length float32 vectors, so the inner product of a
+# normalized query with a stored row is its cosine similarity.
+# Ids are assigned in insertion order (0, 1, 2, ...), which lets the memory
+# system use them directly as positions in its list of memories.
+# search() takes an optional boolean `mask` over ids (e.g. the rows of one
+# session's namespace); only ids where it is True are returned.
+
+# How to choose:
+# - BruteForceIndex: exact, one matrix-vector product per query. Good up to
+#   tens of thousands of memories.
+# - IVFIndex: approximate inverted-file index. Vectors are clustered with
+#   spherical k-means and a query only scans the `nprobe` closest clusters.
+#   Raise `nprobe` for recall, lower it for latency (see index_benchmark.py).
+
+
+def normalize(embedding: Sequence[float]) -> np.ndarray:
+    """Return the embedding as a unit-length float32 vector (or matrix of row vectors)"""
+    vectors = np.asarray(embedding, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, k: int, threshold: float) -> List[Tuple[int, float]]:
+    """Select up to k (id, score) pairs with score >= threshold, best first"""
+    keep = scores >= threshold
+    ids, scores = ids[keep], scores[keep]
+    if k <= 0 or ids.size == 0:
+        return []
+
+    # Select the top k without sorting the whole candidate set
+    if ids.size > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[top], scores[top]
+    # Order by score, ties broken by insertion order
+    order = np.lexsort((ids, -scores))
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+class VectorBuffer:
+    """Contiguous row matrix that grows by amortized doubling"""
+
+    def __init__(self, dtype=np.float32):
+        self._matrix = np.empty((0, 0), dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._matrix[:self._size]
+
+    def append(self, vectors: np.ndarray):
+        count, dim = vectors.shape
+        capacity = self._matrix.shape[0]
+        if self._size + count > capacity:
+            new_capacity = max(16, capacity * 2, self._size + count)
+            grown = np.zeros((new_capacity, dim), dtype=self._matrix.dtype)
+            if self._size:
+                grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        self._matrix[self._size:self._size + count] = vectors
+        self._size += count
+
+
+class VectorIndex:
+    """Interface for the memory system's nearest-neighbour index"""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, embeddings: Sequence[Sequence[float]]) -> List[int]:
+        """Add embeddings (one per row) and return their ids"""
+        raise NotImplementedError
+
+    def search(self, query: Sequence[float], k: int, threshold: float = -1.0,
+               mask: np.ndarray = None) -> List[Tuple[int, float]]:
+        """Return up to k (id, cosine similarity) pairs above threshold, best first
+
+        With a mask, only ids i where mask[i] is True are considered.
+        """
+        raise NotImplementedError
+
+    def load(self, vectors: np.ndarray, chunk_size: int = 65536):
+        """Bulk-add already normalized vectors, e.g. a memory-mapped store at startup"""
+        for start in range(0, len(vectors), chunk_size):
+            self.add(vectors[start:start + chunk_size])
+
+
+class BruteForceIndex(VectorIndex):
+    """Exact search: cosine similarity against every stored vector"""
+
+    def __init__(self):
+        # Read-only vectors adopted by load() (possibly memory-mapped), then
+        # vectors added at runtime
+        self.base = np.empty((0, 0), dtype=np.float32)
+        self.buffer = VectorBuffer()
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.buffer)
+
+    def add(self, embeddings: Sequence[Sequence[float]]) -> List[int]:
+        vectors = normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        start = len(self)
+        self.buffer.append(vectors)
+        return list(range(start, start + len(vectors)))
+
+    def load(self, vectors: np.ndarray, chunk_size: int = 65536):
+        if len(self):
+            return super().load(vectors, chunk_size)
+        # Adopt the matrix as-is; with a memmap, pages are read on first search
+        self.base = vectors
+
+    def search(self, query: Sequence[float], k: int, threshold: float = -1.0,
+               mask: np.ndarray = None) -> List[Tuple[int, float]]:
+        if not len(self):
+            return []
+        query = normalize(query)
+        if mask is not None:
+            # Score only the selected rows
+            ids = np.flatnonzero(mask[:len(self)])
+            in_base = ids < len(self.base)
+            scores = np.concatenate([
+                self.base[ids[in_base]] @ query if in_base.any() else np.empty(0, dtype=np.float32),
+                self.buffer.vectors[ids[~in_base] - len(self.base)] @ query if not in_base.all()
+                else np.empty(0, dtype=np.float32),
+            ])
+            return top_k(ids, scores, k, threshold)
+        scores = np.concatenate([
+            self.base @ query if len(self.base) else np.empty(0, dtype=np.float32),
+            self.buffer.vectors @ query if len(self.buffer) else np.empty(0, dtype=np.float32),
+        ])
+        return top_k(np.arange(scores.shape[0]), scores, k, threshold)
+
+
+class IVFIndex(VectorIndex):
+    """Approximate search over an inverted file of spherical k-means clusters
+
+    Args:
+        nlist: Number of clusters. Defaults to ~sqrt(N) at each (re)training.
+        nprobe: Number of closest clusters scanned per query (recall vs latency).
+        min_train_size: Below this many vectors the index searches exhaustively.
+        retrain_growth: Retrain the clusters once the index has grown by this factor
+            since the last training; in between, new vectors are assigned incrementally.
+        kmeans_iterations: Lloyd iterations per training run.
+        seed: Seed for centroid initialization and training samples.
+    """
+
+    def __init__(self, nlist: int = None, nprobe: int = 8, min_train_size: int = 1024,
+                 retrain_growth: float = 4.0, kmeans_iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.kmeans_iterations = kmeans_iterations
+        self.rng = np.random.default_rng(seed)
+        self.buffer = VectorBuffer()
+        self.centroids = None
+        self.lists: List[VectorBuffer] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def add(self, embeddings: Sequence[Sequence[float]]) -> List[int]:
+        vectors = normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        start = len(self.buffer)
+        self.buffer.append(vectors)
+        ids = np.arange(start, start + len(vectors))
+
+        if self.centroids is None or len(self.buffer) >= self._trained_size * self.retrain_growth:
+            if len(self.buffer) >= self.min_train_size:
+                self.train()
+        else:
+            self._assign(ids, vectors)
+        return ids.tolist()
+
+    def train(self):
+        """(Re)cluster all stored vectors and rebuild the inverted lists"""
+        vectors = self.buffer.vectors
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        # Train on a bounded sample, then assign everything
+        sample_size = min(len(vectors), nlist * 64)
+        sample = vectors[self.rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[self.rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind='stable')
+            clusters = assignment[order]
+            starts = np.flatnonzero(np.r_[True, clusters[1:] != clusters[:-1]])
+            sums = np.zeros_like(centroids)
+            sums[clusters[starts]] = np.add.reduceat(sample[order], starts)
+            empty = ~sums.any(axis=1)
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[self.rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize(sums)
+
+        self.centroids = centroids
+        self.lists = [VectorBuffer(dtype=np.int64) for _ in range(nlist)]
+        self._trained_size = len(vectors)
+        self._assign(np.arange(len(vectors)), vectors)
+
+    def _assign(self, ids: np.ndarray, vectors: np.ndarray):
+        """Append ids to the inverted list of their nearest centroid"""
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        for cluster in np.unique(assignment):
+            members = ids[assignment == cluster]
+            self.lists[cluster].append(members.reshape(-1, 1))
+
+    def search(self, query: Sequence[float], k: int, threshold: float = -1.0,
+               mask: np.ndarray = None) -> List[Tuple[int, float]]:
+        if not len(self.buffer):
+            return []
+        query = normalize(query)
+        if self.centroids is None:
+            ids = np.arange(len(self.buffer)) if mask is None else np.flatnonzero(mask[:len(self.buffer)])
+            scores = self.buffer.vectors[ids] @ query
+            return top_k(ids, scores, k, threshold)
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        ids = np.concatenate([self.lists[c].vectors.ravel() for c in probes])
+        if mask is not None:
+            ids = ids[mask[ids]]
+        scores = self.buffer.vectors[ids] @ query
+        return top_k(ids, scores, k, threshold)